@@ -1,8 +1,14 @@
 import openai
 import json
 import os
+import asyncio
+import random
+import threading
 from dotenv import load_dotenv
 import logging
+from LLM_agents.fast_router import fast_router
+from LLM_agents.semantic_cache import router_cache, sql_cache, encode_query
+from LLM_agents.llm_gateway import chat_completion
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,10 +18,12 @@ load_dotenv()
 # OpenAI API key
 openai_api_key = os.getenv('OPENAI_API_KEY')
 
-# Initialize OpenAI API
-client = openai.OpenAI(
-    api_key=openai_api_key,
-)
+# Set to 'false' to send every query to the LLM router
+FAST_ROUTER_ENABLED = os.getenv('FAST_ROUTER_ENABLED', 'true').lower() == 'true'
+
+# Fraction of LLM-routed queries that use one fused routing + SQL call instead of
+# select_agent followed by generate_sql_query (0 = always two calls, 1 = always fused)
+FUSED_ROUTING_RATIO = float(os.getenv('FUSED_ROUTING_RATIO', '0'))
 
 
 def generate_prompt(user_query: str) -> str:
@@ -72,7 +80,7 @@ def generate_prompt(user_query: str) -> str:
     """
     return prompt
 
-def select_agent(user_query: str):
+async def select_agent(user_query: str):
     """
     Interact with GPT-4 model to choose the appropriate agent function.
     """
@@ -80,15 +88,11 @@ def select_agent(user_query: str):
     if not openai_api_key:
         raise ValueError("OpenAI API key not found. Make sure it is set in the .env file.")
 
-    if not client:
-        logging.error("OpenAI client initialization failed.")
-        raise ValueError("OpenAI client could not be initialized. Check API key or client configuration.")
-    
     # Generate the prompt
     prompt = generate_prompt(user_query)
     
     try:
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that generates SQL queries in JSON format"},
@@ -121,3 +125,190 @@ def select_agent(user_query: str):
         # Catch all other exceptions
         logging.error(f"An error occurred: {e}")
         return "invalid question"
+
+
+# Structured output schema for the fused call; sql and chart_type are null unless the
+# text_to_sql_agent is chosen
+FUSED_RESPONSE_SCHEMA = {
+    "name": "route_and_sql",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "agent": {"type": "string", "enum": ["vector_search_agent", "text_to_sql_agent", "invalid question"]},
+            "sql": {"type": ["string", "null"]},
+            "chart_type": {"type": ["string", "null"], "enum": ["Bar", "Pie", "Line", "Null", None]},
+        },
+        "required": ["agent", "sql", "chart_type"],
+        "additionalProperties": False,
+    },
+}
+
+
+def generate_fused_prompt(user_query: str) -> str:
+    """
+    Generate a prompt that asks GPT-4 to choose the agent and, for the text_to_sql_agent,
+    also write the SQL query and chart type in the same response.
+    """
+    prompt = f"""
+    You are a helpful assistant that routes questions about the user's job applications and, when needed, converts them to SQL.
+
+    The relevant table schema is as follows:
+
+    CREATE TABLE applied_companies (
+        id SERIAL PRIMARY KEY,
+        company_name VARCHAR(255) NOT NULL,
+        company_website VARCHAR(255),
+        job_position VARCHAR(255),
+        applied_date TIMESTAMP WITH TIME ZONE NOT NULL,
+        application_status VARCHAR(255),
+        UNIQUE (company_name, job_position)
+    );
+
+    Choose the "agent" with these rules:
+    1. **If the query mentions a specific company**, choose 'vector_search_agent'.
+    2. **If the query is generic or refers to multiple companies without mentioning a specific company name**, choose 'text_to_sql_agent'.
+    3. **If the query doesn't ask questions about a specific company or companies in general**, choose 'invalid question'.
+
+    Only when the agent is 'text_to_sql_agent', also fill in:
+    - "sql": one grammatically correct PostgreSQL query on the table above, selecting at most 5 fields and using 'LIMIT 5' unless the user specifies a different number.
+    - "chart_type": 'Bar', 'Pie' or 'Line' if the user asks to show, display or visualize the data, otherwise 'Null'.
+    For any other agent, set "sql" and "chart_type" to null.
+
+    Examples:
+    - User query: "What is the status of my application at Google?"
+      Response: {{"agent": "vector_search_agent", "sql": null, "chart_type": null}}
+    - User query: "How many companies have I applied to?"
+      Response: {{"agent": "text_to_sql_agent", "sql": "SELECT COUNT(DISTINCT company_name) AS company_count FROM applied_companies", "chart_type": "Null"}}
+    - User query: "What's the weather like?"
+      Response: {{"agent": "invalid question", "sql": null, "chart_type": null}}
+
+    Here is the user query:
+    {user_query}
+    """
+    return prompt
+
+async def select_agent_and_sql(user_query: str):
+    """
+    Interact with GPT-4 once to choose the agent and, for analytic queries, generate the SQL.
+    Returns (agent, {"sql", "chart_type"} or None).
+    """
+
+    if not openai_api_key:
+        raise ValueError("OpenAI API key not found. Make sure it is set in the .env file.")
+
+    prompt = generate_fused_prompt(user_query)
+
+    try:
+        response = await chat_completion(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that generates SQL queries in JSON format"},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=150,
+            temperature=0,
+            response_format={"type": "json_schema", "json_schema": FUSED_RESPONSE_SCHEMA}
+        )
+
+        response_text = response.choices[0].message.content.strip()
+        logging.info(f"Fused routing response: {response_text}")
+
+        try:
+            json_output = json.loads(response_text)
+        except json.JSONDecodeError:
+            logging.error("Failed to parse GPT response as JSON. Here is the raw output:\n%s", response_text)
+            return "invalid question", None
+
+        agent = json_output.get("agent", "invalid question")
+        if agent == 'text_to_sql_agent' and json_output.get("sql"):
+            return agent, {"sql": json_output["sql"], "chart_type": json_output.get("chart_type") or 'Null'}
+        return agent, None
+
+    except openai.APIError as e:
+        # Handle any OpenAI API errors
+        logging.error(f"OpenAI API error occurred: {e}")
+        return "invalid question", None
+    except Exception as e:
+        # Catch all other exceptions
+        logging.error(f"An error occurred: {e}")
+        return "invalid question", None
+
+
+# Per-arm counters for comparing the fused call against select_agent + generate_sql_query
+_routing_stats = {
+    "two_call": {"queries": 0, "llm_ms_total": 0.0},
+    "fused": {"queries": 0, "llm_ms_total": 0.0},
+}
+_routing_stats_lock = threading.Lock()
+
+
+def choose_routing_arm():
+    """Pick the A/B arm for one query according to FUSED_ROUTING_RATIO."""
+    return "fused" if random.random() < FUSED_ROUTING_RATIO else "two_call"
+
+
+def record_routing_latency(arm: str, elapsed_ms: float):
+    """Record the LLM time (routing plus SQL generation) spent on one analytic query."""
+    with _routing_stats_lock:
+        _routing_stats[arm]["queries"] += 1
+        _routing_stats[arm]["llm_ms_total"] += elapsed_ms
+
+
+def get_routing_stats():
+    with _routing_stats_lock:
+        snapshot = {arm: dict(values) for arm, values in _routing_stats.items()}
+    for values in snapshot.values():
+        values["llm_ms_avg"] = round(values["llm_ms_total"] / values["queries"], 1) if values["queries"] else 0.0
+        values["llm_ms_total"] = round(values["llm_ms_total"], 1)
+    return snapshot
+
+
+async def route_query(user_query: str, fused: bool = False):
+    """
+    Choose the agent for a query: reuse a cached decision for the same or a near-identical
+    query, then try the local fast router, and only fall back to the LLM when neither is
+    confident. With fused=True the LLM fallback also writes the SQL in the same call.
+
+    Returns (agent, {"sql", "chart_type"} or None, llm_routed); None means generate_sql_query
+    is still needed, and llm_routed tells whether the LLM made the routing decision.
+    """
+    agent = router_cache.lookup_exact(user_query)
+    if agent is not None:
+        return agent, None, False
+
+    # Queries naming an applied company are routed by a regex, before paying for an encode
+    if FAST_ROUTER_ENABLED:
+        try:
+            agent = fast_router.match_company(user_query)
+            if agent is not None:
+                return agent, None, False
+        except Exception as e:
+            logging.error(f"Fast router failed, falling back to the LLM: {e}")
+
+    query_vector = await asyncio.to_thread(encode_query, user_query)
+
+    if FAST_ROUTER_ENABLED:
+        try:
+            agent = await asyncio.to_thread(fast_router.match_exemplars, user_query, query_vector)
+            if agent is not None:
+                return agent, None, False
+        except Exception as e:
+            logging.error(f"Fast router failed, falling back to the LLM: {e}")
+
+    agent = router_cache.lookup_similar(user_query, query_vector)
+    if agent is not None:
+        return agent, None, False
+
+    sql_response = None
+    if fused:
+        agent, sql_response = await select_agent_and_sql(user_query)
+        if sql_response is not None:
+            sql_cache.store(user_query, query_vector, sql_response)
+    else:
+        agent = await select_agent(user_query)
+
+    # The LLM paths also answer 'invalid question' on API errors, so only real routes are cached
+    if agent in ('vector_search_agent', 'text_to_sql_agent'):
+        router_cache.store(user_query, query_vector, agent)
+    return agent, sql_response, True
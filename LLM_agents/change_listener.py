@@ -0,0 +1,143 @@
+import json
+import select
+import threading
+import logging
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from LLM_agents.db_pool import DB_HOST_NAME, MAINTENANCE_DB, DB_USERNAME, DB_PASSWORD, note_primary_write
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Channel the Prefect pipeline notifies after it writes to applied_companies
+CHANGE_CHANNEL = 'applied_companies_changed'
+
+# Embedding inserts go to their own channel, so they do not clear caches that only depend
+# on applied_companies or bump the data version
+EMBEDDINGS_CHANNEL = 'applied_companies_embeddings_changed'
+_TABLE_CHANNELS = {'applied_companies_embeddings': EMBEDDINGS_CHANNEL}
+
+# How long the listener waits on the socket before re-checking whether it should stop
+POLL_INTERVAL_SECONDS = 5.0
+MAX_RECONNECT_DELAY_SECONDS = 60.0
+
+_subscribers = []
+_listener = None
+_stop_event = threading.Event()
+
+# Bumped on every notification (and every resync), so caches can key results by it
+_data_version = 0
+
+
+def notify_change(cursor, table, ids):
+    """
+    Queue a change notification on the writer's transaction.
+
+    Postgres only delivers NOTIFY on commit, so listeners never see rows that were rolled back.
+    """
+    payload = json.dumps({"table": table, "ids": list(ids)})
+    cursor.execute("SELECT pg_notify(%s, %s)", (_TABLE_CHANNELS.get(table, CHANGE_CHANNEL), payload))
+
+
+def subscribe(callback, channels=(CHANGE_CHANNEL,)):
+    """
+    Register a callback for change notifications on the given channels.
+
+    The callback receives the decoded payload dict, or None when changes may have been missed
+    (e.g. after the listener reconnects) and the subscriber should resync from the database.
+    """
+    _subscribers.append((callback, set(channels)))
+
+
+def get_data_version():
+    """Return a counter that increases whenever applied_companies may have changed."""
+    return _data_version
+
+
+def _dispatch(channel, payload):
+    """Deliver a payload from channel; None (a resync) goes to every subscriber."""
+    global _data_version
+    # Read your writes: pin reads to the primary before publishing the new version, so nothing
+    # read from a lagging replica can be cached under it
+    note_primary_write(payload)
+    if channel == CHANGE_CHANNEL or payload is None:
+        _data_version += 1
+    for callback, channels in list(_subscribers):
+        if payload is not None and channel not in channels:
+            continue
+        try:
+            callback(payload)
+        except Exception as e:
+            logging.error(f"Change subscriber {callback!r} failed: {e}")
+
+
+def _parse_payload(raw):
+    try:
+        return json.loads(raw) if raw else {}
+    except json.JSONDecodeError:
+        logging.warning(f"Ignoring malformed change payload: {raw}")
+        return {}
+
+
+def _listen_forever():
+    """Hold a dedicated LISTEN connection, reconnecting with backoff until stopped."""
+    delay = 1.0
+    connected_before = False
+
+    while not _stop_event.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(
+                host=DB_HOST_NAME,
+                database=MAINTENANCE_DB,
+                user=DB_USERNAME,
+                password=DB_PASSWORD
+            )
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                for channel in (CHANGE_CHANNEL, EMBEDDINGS_CHANNEL):
+                    cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+            logging.info(f"Listening for changes on channels '{CHANGE_CHANNEL}' and '{EMBEDDINGS_CHANNEL}'.")
+
+            # Notifications sent while we were disconnected are lost, so subscribers must resync
+            if connected_before:
+                _dispatch(None, None)
+            connected_before = True
+            delay = 1.0
+
+            while not _stop_event.is_set():
+                if select.select([conn], [], [], POLL_INTERVAL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    logging.info(f"Received change notification: {notification.payload}")
+                    _dispatch(notification.channel, _parse_payload(notification.payload))
+
+        except (Exception, psycopg2.Error) as e:
+            logging.error(f"Change listener error, reconnecting in {delay:.0f}s: {e}")
+            _stop_event.wait(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_listener():
+    """Start the background LISTEN thread once per process."""
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+    _stop_event.clear()
+    _listener = threading.Thread(target=_listen_forever, name="change-listener", daemon=True)
+    _listener.start()
+
+
+def stop_listener():
+    """Signal the LISTEN thread to exit and wait briefly for it."""
+    global _listener
+    _stop_event.set()
+    if _listener is not None:
+        _listener.join(timeout=POLL_INTERVAL_SECONDS + 1)
+        _listener = None
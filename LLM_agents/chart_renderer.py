@@ -0,0 +1,228 @@
+import os
+import io
+import asyncio
+import logging
+import multiprocessing
+from datetime import date, datetime
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Output formats the renderer can produce and the media types they are served with
+CHART_MEDIA_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+
+# Defaults size the chart to the 600px-wide extension popup
+CHART_FORMAT = os.getenv('CHART_FORMAT', 'png')
+CHART_WIDTH_INCHES = float(os.getenv('CHART_WIDTH_INCHES', '5.6'))
+CHART_HEIGHT_INCHES = float(os.getenv('CHART_HEIGHT_INCHES', '3.5'))
+CHART_DPI = int(os.getenv('CHART_DPI', '100'))
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', '2'))
+
+# Media type of the declarative chart spec the popup renders itself
+CHART_SPEC_MEDIA_TYPE = 'application/vnd.vegalite.v5+json'
+
+# Chart types draw_chart and build_chart_spec know; anything else is answered as a table
+CHART_TYPES = ('Bar', 'Pie', 'Line')
+
+_executor = None
+
+
+def _init_worker():
+    """Import the plotting stack and draw a throwaway figure so the first real render is warm."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import pandas  # noqa: F401
+    import seaborn  # noqa: F401
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(1, 1))
+    figure.subplots().plot([0, 1], [0, 1])
+    figure.savefig(io.BytesIO(), format='png')
+
+
+def _warmup():
+    return os.getpid()
+
+
+def draw_chart(ax, df, chart_type: str) -> bool:
+    """
+    Draw a Bar, Pie or Line chart of the first two DataFrame columns onto a Matplotlib Axes.
+    Uses only the object-oriented API, so concurrent renders never share pyplot state.
+
+    Returns:
+        bool: True if the chart was drawn, False if the data or chart type was unusable
+    """
+    import seaborn as sns
+
+    try:
+        if chart_type == 'Bar':
+            if len(df.columns) < 2:
+                raise ValueError("Bar chart requires at least two columns")
+
+            sns.barplot(x=df.iloc[:, 0], y=df.iloc[:, 1], palette='viridis', ax=ax)
+            ax.set_title("Bar Chart Visualization")
+            ax.tick_params(axis='x', labelrotation=45)
+            for label in ax.get_xticklabels():
+                label.set_horizontalalignment('right')
+
+        elif chart_type == 'Pie':
+            if len(df.columns) < 2:
+                raise ValueError("Pie chart requires at least two columns")
+
+            ax.pie(df.iloc[:, 1], labels=df.iloc[:, 0],
+                   autopct='%1.1f%%', startangle=140,
+                   colors=sns.color_palette('viridis'))
+            ax.set_title("Pie Chart Visualization")
+            ax.axis('equal')
+
+        elif chart_type == 'Line':
+            if len(df.columns) < 2:
+                raise ValueError("Line chart requires at least two columns")
+
+            sns.lineplot(x=df.iloc[:, 0], y=df.iloc[:, 1],
+                         marker='o', linestyle='-', color='b', ax=ax)
+            ax.set_title("Line Chart Visualization")
+            ax.tick_params(axis='x', labelrotation=45)
+            for label in ax.get_xticklabels():
+                label.set_horizontalalignment('right')
+
+        else:
+            logging.error(f"Unknown chart type: {chart_type}")
+            return False
+
+        return True
+
+    except Exception as e:
+        logging.error(f"Error creating {chart_type} chart: {e}")
+        return False
+
+
+def render_chart_bytes(result, headers, chart_type, fmt, width, height, dpi) -> bytes:
+    """Render a SQL result as a chart image on a private Figure. Runs inside a worker process."""
+    import pandas as pd
+    from matplotlib.figure import Figure
+
+    df = pd.DataFrame(result, columns=headers)
+
+    # Handle datetime columns for visualization
+    for col in df.select_dtypes(include=['datetime64[ns]']).columns:
+        df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    figure = Figure(figsize=(width, height), dpi=dpi)
+    draw_chart(figure.subplots(), df, chart_type)
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format=fmt, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _spec_value(value):
+    """Convert a database value into something JSON can carry."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def build_chart_spec(result, headers, chart_type: str) -> dict:
+    """
+    Build a Vega-Lite style spec, with the data inline, for the same first two columns that
+    draw_chart plots. Cheap enough to run on the event loop; no plotting libraries are involved.
+    """
+    if chart_type not in CHART_TYPES:
+        raise ValueError(f"Unknown chart type: {chart_type}")
+    if not headers or len(headers) < 2:
+        raise ValueError(f"{chart_type} chart requires at least two columns")
+
+    x_field, y_field = headers[0], headers[1]
+    values = [{x_field: _spec_value(row[0]), y_field: _spec_value(row[1])} for row in result]
+    x_is_temporal = bool(result) and isinstance(result[0][0], (datetime, date))
+
+    spec = {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": f"{chart_type} Chart Visualization",
+        "data": {"values": values},
+    }
+    if chart_type == 'Bar':
+        spec["mark"] = "bar"
+        spec["encoding"] = {
+            "x": {"field": x_field, "type": "nominal"},
+            "y": {"field": y_field, "type": "quantitative"},
+        }
+    elif chart_type == 'Pie':
+        spec["mark"] = "arc"
+        spec["encoding"] = {
+            "theta": {"field": y_field, "type": "quantitative"},
+            "color": {"field": x_field, "type": "nominal"},
+        }
+    else:
+        spec["mark"] = {"type": "line", "point": True}
+        spec["encoding"] = {
+            "x": {"field": x_field, "type": "temporal" if x_is_temporal else "ordinal"},
+            "y": {"field": y_field, "type": "quantitative"},
+        }
+    return spec
+
+
+def start_renderer():
+    """Create the worker pool and warm every worker so imports happen before the first request."""
+    global _executor
+    if _executor is None:
+        # spawn gives workers a clean interpreter instead of forking a process that holds the
+        # embedding model and live database sockets
+        _executor = ProcessPoolExecutor(
+            max_workers=CHART_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        for future in [_executor.submit(_warmup) for _ in range(CHART_RENDER_WORKERS)]:
+            future.result()
+        logging.info(f"Chart renderer started with {CHART_RENDER_WORKERS} workers.")
+    return _executor
+
+
+def stop_renderer():
+    """Shut the worker pool down."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def render_chart(result, headers, chart_type, fmt=CHART_FORMAT):
+    """
+    Render a chart in the worker pool without blocking the event loop.
+
+    Returns:
+        tuple: (image bytes, media type)
+    """
+    global _executor
+    if fmt not in CHART_MEDIA_TYPES:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+
+    loop = asyncio.get_running_loop()
+    executor = _executor or await loop.run_in_executor(None, start_renderer)
+    try:
+        content = await loop.run_in_executor(
+            executor, render_chart_bytes,
+            result, headers, chart_type, fmt, CHART_WIDTH_INCHES, CHART_HEIGHT_INCHES, CHART_DPI
+        )
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); drop the pool so the next render starts a fresh one
+        logging.error("Chart renderer pool broke; it will be restarted on the next request.")
+        _executor = None
+        raise
+    return content, CHART_MEDIA_TYPES[fmt]
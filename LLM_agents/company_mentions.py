@@ -0,0 +1,63 @@
+import re
+
+# Separators between the companies of a list-style question ("Stripe, Plaid and Brex")
+_LIST_SEPARATOR = re.compile(r'\s*(?:[,;]|\s&\s|\band\b|\bor\b|\bvs\.?(?=\s)|\bversus\b)\s*', re.IGNORECASE)
+
+# Words trimmed from the ends of a fragment; a fragment made only of these names no company
+_NON_COMPANY_WORDS = {
+    'when', 'what', 'whats', 'where', 'why', 'how', 'who', 'which', 'did', 'do', 'does', 'have', 'has',
+    'had', 'been', 'be', 'am', 'are', 'is', 'was', 'were', 'i', 'me', 'my', 'it', 's', 'the', 'a', 'an',
+    'to', 'at', 'by', 'for', 'from', 'with', 'about', 'of', 'on', 'in', 'status', 'date', 'position',
+    'role', 'also', 'too', 'apply', 'applied', 'application', 'applications', 'there', 'any', 'update',
+    'updates', 'hear', 'heard', 'back', 'get', 'got',
+}
+
+
+def _words(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def _name_pattern(name):
+    """Match a company name as whole words, whatever punctuation or spacing separates them."""
+    return re.compile(r'\b' + r'\W+'.join(map(re.escape, _words(name))) + r'\b', re.IGNORECASE)
+
+
+def exact_names(names):
+    """
+    Distinct company names in their original order, without names contained in a longer one
+    ("Meta" when "Meta Platforms" was also found).
+    """
+    keys = {}
+    for name in names:
+        key = ' '.join(_words(name))
+        if key and key not in keys:
+            keys[key] = name
+    return [name for key, name in keys.items()
+            if not any(other != key and f" {key} " in f" {other} " for other in keys)]
+
+
+def candidate_fragments(query, names, max_words):
+    """
+    Parts of a list-style question outside the company names already found in it, trimmed of
+    question words, e.g. ["Plaid", "Brex"] for "Did I apply to Stripe, Plaid and Brex?" once
+    "Stripe" is known. A separator inside a found name ("Johnson & Johnson") never splits it.
+    Only fragments of at most max_words words are returned; callers keep a fragment as a
+    company mention only if it matches a known company name.
+    """
+    # Found names become a placeholder, so only separators outside them make this a list
+    text = query
+    for name in names:
+        text = _name_pattern(name).sub('\x00', text)
+    if not _LIST_SEPARATOR.search(text):
+        return []
+
+    fragments = []
+    for part in _LIST_SEPARATOR.split(text.replace('\x00', ',').strip().rstrip('?!. ')):
+        words = re.findall(r"[\w'&.-]+", part)
+        while words and set(_words(words[0])) <= _NON_COMPANY_WORDS:
+            words.pop(0)
+        while words and set(_words(words[-1])) <= _NON_COMPANY_WORDS:
+            words.pop()
+        if words and len(words) <= max_words:
+            fragments.append(' '.join(words))
+    return list(dict.fromkeys(fragments))
@@ -0,0 +1,404 @@
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool, extensions
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# PostgreSQL connection parameters
+DB_HOST_NAME = os.getenv('DB_HOST_NAME')
+MAINTENANCE_DB = os.getenv('MAINTENANCE_DB')
+DB_USERNAME = os.getenv('DB_USERNAME')
+DB_PASSWORD = os.getenv('DB_PASSWORD')
+
+# Pool sizing and recycling parameters
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))  # Seconds before a connection is recycled
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))  # Idle seconds before a ping on borrow
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '10'))  # Seconds to wait for a free connection
+
+# Optional read replica (libpq DSN, e.g. "host=replica port=5432 dbname=jobs user=reader password=...")
+# for read-only queries. Reads fall back to the primary while the replica lags more than
+# DB_REPLICA_MAX_LAG_SECONDS, and for that long after each write, so readers never see older data.
+DB_REPLICA_DSN = os.getenv('DB_REPLICA_DSN') or None
+DB_REPLICA_POOL_MAX_SIZE = int(os.getenv('DB_REPLICA_POOL_MAX_SIZE', str(DB_POOL_MAX_SIZE)))
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '30'))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '5'))
+
+# Seconds of replay lag; 0 when the replica has replayed everything it received, so an idle
+# primary does not look like lag
+REPLICA_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END;
+"""
+
+
+class _IdleKeepingPool(pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that keeps returned connections open for reuse up to maxconn.
+    psycopg2's own pool closes every connection returned once minconn are idle, so bursts
+    above minconn paid a fresh handshake per request. on_close is called for each connection
+    the pool closes.
+    """
+
+    def __init__(self, minconn, maxconn, on_close, *args, **kwargs):
+        self._on_close = on_close
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def _putconn(self, conn, key=None, close=False):
+        if self.closed:
+            raise pool.PoolError("connection pool is closed")
+        if key is None:
+            key = self._rused.get(id(conn))
+            if key is None:
+                raise pool.PoolError("trying to put unkeyed connection")
+
+        if not close and not conn.closed and len(self._pool) < self.maxconn:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                # Server connection lost
+                close = True
+            else:
+                try:
+                    if status != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    self._pool.append(conn)
+                except psycopg2.Error:
+                    close = True
+        else:
+            close = True
+
+        if close:
+            conn.close()
+            self._on_close(conn)
+
+        # A thread may return a connection after closeall(); the key is gone by then
+        if not self.closed or key in self._used:
+            del self._used[key]
+            del self._rused[id(conn)]
+
+
+class DatabasePool:
+    """
+    Bounded, thread-safe pool of PostgreSQL connections.
+
+    Wraps a ThreadedConnectionPool that keeps up to maxconn idle connections open with a
+    semaphore so callers wait for a free connection instead of failing immediately, pings
+    connections that have been idle for a while before handing them out, and recycles
+    connections older than max_lifetime.
+    """
+
+    def __init__(self, minconn, maxconn, max_lifetime, health_check_interval, acquire_timeout, **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._lock = threading.Lock()
+        self._created_at = {}
+        self._last_used = {}
+        self._pool = _IdleKeepingPool(minconn, maxconn, self._forget, **conn_kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._stats = {
+            "acquired": 0,
+            "acquire_timeouts": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "total_wait_ms": 0.0,
+        }
+
+    def _forget(self, conn):
+        """Drop the bookkeeping of a connection the pool has closed."""
+        with self._lock:
+            self._created_at.pop(conn, None)
+            self._last_used.pop(conn, None)
+
+    def _discard(self, conn):
+        """Close a connection; the pool forgets its bookkeeping."""
+        self._pool.putconn(conn, close=True)
+
+    def _is_healthy(self, conn):
+        """Run a trivial query to make sure the server side of the connection is still alive."""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.warning(f"Pooled connection failed health check: {e}")
+            return False
+
+    def getconn(self):
+        """Borrow a connection, waiting up to acquire_timeout seconds for one to become free."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._stats["acquire_timeouts"] += 1
+            raise pool.PoolError("Timed out waiting for a free database connection.")
+
+        try:
+            # A recycled or broken connection is replaced once; a second failure is a real outage
+            for _ in range(2):
+                conn = self._pool.getconn()
+                now = time.monotonic()
+                with self._lock:
+                    created_at = self._created_at.setdefault(conn, now)
+                    last_used = self._last_used.get(conn, now)
+
+                if conn.closed or now - created_at > self.max_lifetime:
+                    with self._lock:
+                        self._stats["recycled"] += 1
+                    self._discard(conn)
+                    continue
+
+                if now - last_used > self.health_check_interval and not self._is_healthy(conn):
+                    with self._lock:
+                        self._stats["health_check_failures"] += 1
+                    self._discard(conn)
+                    continue
+
+                with self._lock:
+                    self._stats["acquired"] += 1
+                    self._stats["total_wait_ms"] += (now - started) * 1000
+                return conn
+
+            raise pool.PoolError("Unable to obtain a healthy database connection.")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Return a borrowed connection; the pool rolls back any transaction left open."""
+        try:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._last_used[conn] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def owns(self, conn):
+        """True if conn is currently borrowed from this pool."""
+        with self._lock:
+            return id(conn) in self._pool._rused
+
+    def closeall(self):
+        """Close every connection held by the pool."""
+        self._pool.closeall()
+        with self._lock:
+            self._created_at.clear()
+            self._last_used.clear()
+
+    def stats(self):
+        """Return a snapshot of pool usage counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            in_use = len(self._pool._used)
+            idle = len(self._pool._pool)
+        total_wait_ms = snapshot.pop("total_wait_ms")
+        snapshot["avg_wait_ms"] = round(total_wait_ms / snapshot["acquired"], 3) if snapshot["acquired"] else 0.0
+        snapshot.update({
+            "min_size": self.minconn,
+            "max_size": self.maxconn,
+            "in_use": in_use,
+            "idle": idle,
+        })
+        return snapshot
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+_replica_pool = None
+_replica_state = {
+    "lag_seconds": None,
+    "checked_at": None,
+    "fresh": False,
+    "primary_until": 0.0,
+    "replica_reads": 0,
+    "primary_fallbacks": 0,
+    "lag_check_failures": 0,
+}
+_replica_lock = threading.Lock()
+
+
+def init_pool():
+    """Create the shared connection pool if it does not exist yet and return it."""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = DatabasePool(
+                DB_POOL_MIN_SIZE,
+                DB_POOL_MAX_SIZE,
+                DB_POOL_MAX_LIFETIME,
+                DB_POOL_HEALTH_CHECK_INTERVAL,
+                DB_POOL_ACQUIRE_TIMEOUT,
+                host=DB_HOST_NAME,
+                database=MAINTENANCE_DB,
+                user=DB_USERNAME,
+                password=DB_PASSWORD
+            )
+            logging.info(f"Database pool created (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE}).")
+        return _db_pool
+
+
+def init_replica_pool():
+    """Create the read replica pool when DB_REPLICA_DSN is set; returns None otherwise."""
+    global _replica_pool
+    if DB_REPLICA_DSN is None:
+        return None
+    with _db_pool_lock:
+        if _replica_pool is None:
+            _replica_pool = DatabasePool(
+                min(DB_POOL_MIN_SIZE, DB_REPLICA_POOL_MAX_SIZE),
+                DB_REPLICA_POOL_MAX_SIZE,
+                DB_POOL_MAX_LIFETIME,
+                DB_POOL_HEALTH_CHECK_INTERVAL,
+                DB_POOL_ACQUIRE_TIMEOUT,
+                dsn=DB_REPLICA_DSN
+            )
+            logging.info(f"Read replica pool created (max={DB_REPLICA_POOL_MAX_SIZE}).")
+        return _replica_pool
+
+
+def close_pool():
+    """Close all pooled connections and drop the shared pools."""
+    global _db_pool, _replica_pool
+    with _db_pool_lock:
+        if _replica_pool is not None:
+            _replica_pool.closeall()
+            _replica_pool = None
+            logging.info("Read replica pool closed.")
+        if _db_pool is not None:
+            _db_pool.closeall()
+            _db_pool = None
+            logging.info("Database pool closed.")
+
+
+def note_primary_write(payload=None):
+    """
+    Send reads to the primary for the next DB_REPLICA_MAX_LAG_SECONDS, so data written just now
+    is visible to readers. The change listener calls it before bumping the data version.
+    """
+    with _replica_lock:
+        _replica_state["primary_until"] = time.monotonic() + DB_REPLICA_MAX_LAG_SECONDS
+
+
+def _replica_is_fresh(replica):
+    """Check replay lag at most every DB_REPLICA_LAG_CHECK_INTERVAL seconds and cache the verdict."""
+    now = time.monotonic()
+    with _replica_lock:
+        if now < _replica_state["primary_until"]:
+            return False
+        checked_at = _replica_state["checked_at"]
+        if checked_at is not None and now - checked_at < DB_REPLICA_LAG_CHECK_INTERVAL:
+            return _replica_state["fresh"]
+        # Claim the check so concurrent readers use the previous verdict meanwhile
+        _replica_state["checked_at"] = now
+        previous = _replica_state["fresh"]
+
+    lag = None
+    try:
+        conn = replica.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_QUERY)
+                lag = float(cursor.fetchone()[0])
+            conn.rollback()
+        finally:
+            replica.putconn(conn)
+    except Exception as e:
+        logging.warning(f"Read replica lag check failed: {e}")
+
+    with _replica_lock:
+        if lag is None:
+            _replica_state["lag_check_failures"] += 1
+            _replica_state["fresh"] = False
+        else:
+            _replica_state["lag_seconds"] = round(lag, 3)
+            _replica_state["fresh"] = lag <= DB_REPLICA_MAX_LAG_SECONDS
+        if previous != _replica_state["fresh"]:
+            logging.info(f"Read replica {'in use' if _replica_state['fresh'] else 'bypassed'} (lag: {lag}).")
+        return _replica_state["fresh"]
+
+
+def acquire_connection(readonly=False):
+    """
+    Borrow a connection from the shared pool, or return None if none can be obtained.
+    With readonly=True the read replica is used when one is configured and fresh enough.
+    """
+    if readonly and _replica_pool is not None:
+        replica = _replica_pool
+        if _replica_is_fresh(replica):
+            try:
+                conn = replica.getconn()
+                with _replica_lock:
+                    _replica_state["replica_reads"] += 1
+                return conn
+            except Exception as e:
+                logging.warning(f"Read replica unavailable, using the primary: {e}")
+        with _replica_lock:
+            _replica_state["primary_fallbacks"] += 1
+
+    try:
+        return init_pool().getconn()
+    except Exception as e:
+        logging.error(f"Error acquiring a database connection: {e}")
+        return None
+
+
+def release_connection(conn):
+    """Return a connection obtained from acquire_connection to the pool it came from."""
+    if conn is None:
+        return
+    if _replica_pool is not None and _replica_pool.owns(conn):
+        _replica_pool.putconn(conn)
+    elif _db_pool is not None:
+        _db_pool.putconn(conn)
+
+
+@contextmanager
+def get_connection(readonly=False):
+    """Context manager that borrows a pooled connection and always returns it."""
+    if readonly:
+        conn = acquire_connection(readonly=True)
+        if conn is None:
+            raise pool.PoolError("Unable to obtain a database connection.")
+    else:
+        conn = init_pool().getconn()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
+
+def get_pool_stats():
+    """Return usage metrics for the shared pool, or an empty dict before it is created."""
+    return _db_pool.stats() if _db_pool is not None else {}
+
+
+def get_replica_stats():
+    """Return read replica routing counters and pool usage, or an empty dict when no replica is configured."""
+    if _replica_pool is None:
+        return {}
+    with _replica_lock:
+        snapshot = {key: value for key, value in _replica_state.items() if key not in ("checked_at", "primary_until")}
+        snapshot["pinned_to_primary"] = time.monotonic() < _replica_state["primary_until"]
+    snapshot["max_lag_seconds"] = DB_REPLICA_MAX_LAG_SECONDS
+    snapshot["pool"] = _replica_pool.stats()
+    return snapshot
@@ -0,0 +1,129 @@
+import json
+import uuid
+import hashlib
+import threading
+import logging
+from LLM_agents.db_pool import get_connection
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Hex characters of SHA-256 kept per domain; 16 (64 bits) keeps collisions negligible for small sets
+DIGEST_HASH_CHARS = 16
+
+# Number of incremental updates retained for the delta feed before clients must refetch in full
+DIGEST_DELTA_LOG_SIZE = 1000
+
+
+def hash_domain(domain):
+    """Hash a registrable domain the same way the extension does before checking the digest."""
+    return hashlib.sha256(domain.encode('utf-8')).hexdigest()[:DIGEST_HASH_CHARS]
+
+
+class DomainDigest:
+    """
+    Versioned, in-memory set of hashed registrable domains from applied_companies.
+
+    The extension downloads the full digest once and then polls the delta feed; any tab whose
+    candidate domains are all absent is a definite "not yet applied" and skips /check-url.
+    Versions look like '<epoch>-<counter>': a full rebuild starts a new epoch, which tells
+    clients holding an older epoch to download the digest again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes = set()
+        self._max_id = 0
+        self._epoch = uuid.uuid4().hex[:8]
+        self._counter = 0
+        self._log = []  # (counter, [hashes added at that counter])
+        self._body = b''
+        self.loaded = False
+
+    @property
+    def version(self):
+        return f"{self._epoch}-{self._counter}"
+
+    def _serialize(self):
+        """Render the full digest once per change so requests just return cached bytes."""
+        self._body = json.dumps({
+            "version": self.version,
+            "hash": "sha256",
+            "hash_chars": DIGEST_HASH_CHARS,
+            "hashes": sorted(self._hashes),
+        }, separators=(',', ':')).encode('utf-8')
+
+    def rebuild(self):
+        """Reload every domain from the database and start a new epoch."""
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COALESCE(MAX(id), 0), ARRAY_REMOVE(ARRAY_AGG(DISTINCT domain), NULL)
+                    FROM applied_companies;
+                """)
+                max_id, domains = cursor.fetchone()
+
+        with self._lock:
+            self._hashes = {hash_domain(domain) for domain in domains or []}
+            self._max_id = max_id
+            self._epoch = uuid.uuid4().hex[:8]
+            self._counter = 0
+            self._log = []
+            self._serialize()
+            self.loaded = True
+        logging.info(f"Domain digest rebuilt with {len(self._hashes)} domains (version {self.version}).")
+
+    def apply_change(self, payload):
+        """
+        Change-listener callback: fold newly inserted or backfilled rows into the digest.
+
+        A None payload means notifications may have been missed, so the digest is rebuilt.
+        """
+        if payload is None or not self.loaded:
+            self.rebuild()
+            return
+        if payload.get('table') != 'applied_companies':
+            return
+
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, domain
+                    FROM applied_companies
+                    WHERE (id > %s OR id = ANY(%s)) AND domain IS NOT NULL;
+                """, (self._max_id, list(payload.get('ids', []))))
+                rows = cursor.fetchall()
+
+        with self._lock:
+            added = sorted({hash_domain(domain) for _, domain in rows} - self._hashes)
+            self._max_id = max([self._max_id] + [row_id for row_id, _ in rows])
+            if not added:
+                return
+
+            self._hashes.update(added)
+            self._counter += 1
+            self._log.append((self._counter, added))
+            del self._log[:-DIGEST_DELTA_LOG_SIZE]
+            self._serialize()
+        logging.info(f"Domain digest updated with {len(added)} new domains (version {self.version}).")
+
+    def snapshot(self):
+        """Return (version, serialized body) for the full digest."""
+        with self._lock:
+            return self.version, self._body
+
+    def delta(self, since):
+        """
+        Return the hashes added after version `since`, or None when the client must refetch
+        the full digest (different epoch, or the change is older than the retained log).
+        """
+        with self._lock:
+            epoch, _, counter = since.partition('-')
+            if epoch != self._epoch or not counter.isdigit():
+                return None
+            counter = int(counter)
+            oldest = self._log[0][0] - 1 if self._log else self._counter
+            if counter < oldest or counter > self._counter:
+                return None
+            added = [h for entry_counter, hashes in self._log if entry_counter > counter for h in hashes]
+            return {"version": self.version, "added": added}
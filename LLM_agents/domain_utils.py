@@ -0,0 +1,47 @@
+from urllib.parse import urlparse
+import tldextract
+
+# Use the public suffix list snapshot bundled with tldextract so lookups never hit the network
+_extract = tldextract.TLDExtract(suffix_list_urls=())
+
+# Applicant tracking systems host many companies under one registrable domain, so the
+# company is identified by the first path segment (or, for Workday, the first subdomain label)
+ATS_PATH_DOMAINS = {'greenhouse.io', 'lever.co', 'ashbyhq.com', 'smartrecruiters.com', 'workable.com'}
+ATS_SUBDOMAIN_DOMAINS = {'myworkdayjobs.com'}
+
+
+def registrable_domain(url):
+    """
+    Normalize a URL or bare host to its registrable domain (eTLD+1), e.g.
+    'https://careers.example.co.uk/jobs' -> 'example.co.uk'.
+
+    ATS-hosted job boards keep the company slug so different companies do not collide:
+    'boards.greenhouse.io/stripe' -> 'greenhouse.io/stripe'. Returns None for empty input.
+    """
+    if not url:
+        return None
+
+    url = url.strip().lower()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+
+    parsed_url = urlparse(url)
+    host = parsed_url.hostname
+    if not host:
+        return None
+
+    extracted = _extract(host)
+    if not extracted.suffix or not extracted.domain:
+        # IP addresses, localhost and unknown suffixes have no registrable part
+        return host
+
+    domain = f"{extracted.domain}.{extracted.suffix}"
+
+    if domain in ATS_PATH_DOMAINS:
+        slug = parsed_url.path.strip('/').split('/')[0]
+        if slug:
+            return f"{domain}/{slug}"
+    elif domain in ATS_SUBDOMAIN_DOMAINS and extracted.subdomain:
+        return f"{domain}/{extracted.subdomain.split('.')[0]}"
+
+    return domain
@@ -3,6 +3,7 @@ import json
 import os
 from dotenv import load_dotenv
 import logging
+from LLM_agents.llm_gateway import chat_completion_sync
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,11 +14,6 @@ load_dotenv()
 # Get OpenAI API Key
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
-# Initialize OpenAI API
-client = openai.OpenAI(
-    api_key=openai_api_key,
-)
-
 def generate_email_prompt(email_context: str) -> str:
     """
     Function to generate the prompt for extracting job application details from emails.
@@ -94,16 +90,12 @@ def get_job_application_details(email_context: str):
     if not openai_api_key:
         raise ValueError("OpenAI API key not found. Make sure it is set in the .env file.")
 
-    if not client:
-        logging.error("OpenAI client initialization failed.")
-        raise ValueError("OpenAI client could not be initialized. Check API key or client configuration.")
-    
     # Generate the prompt
     prompt = generate_email_prompt(email_context)
     
     try:
         # Call the GPT-4 model
-        response = client.chat.completions.create(
+        response = chat_completion_sync(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
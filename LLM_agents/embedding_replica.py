@@ -0,0 +1,210 @@
+import os
+import time
+import threading
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from LLM_agents.db_pool import get_connection
+from LLM_agents.embeddings import normalize_query
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Mirror applied_companies_embeddings in process and answer vector search from it. Postgres
+# stays the source of truth: the mirror is rebuilt from it at startup and after missed
+# notifications, and is not used while it holds more than EMBEDDING_REPLICA_MAX_ROWS rows.
+EMBEDDING_REPLICA = os.getenv('EMBEDDING_REPLICA', 'false').lower() == 'true'
+EMBEDDING_REPLICA_MAX_ROWS = int(os.getenv('EMBEDDING_REPLICA_MAX_ROWS', '100000'))
+
+_ROW_QUERY = """
+    SELECT ace.vector_id, ace.company_embeddings::real[],
+           ac.id, ac.company_name, ac.company_website, ac.job_position, ac.applied_date, ac.application_status
+    FROM applied_companies ac
+    JOIN applied_companies_embeddings ace ON ac.id = ace.applied_company_id
+"""
+
+
+def _normalize_rows(matrix):
+    """L2-normalize each row so a dot product is the cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _name_key(text):
+    """Normalized text padded with spaces, so substring tests only match whole words."""
+    return f" {normalize_query(text or '')} "
+
+
+class EmbeddingReplica:
+    """
+    In-memory copy of applied_companies_embeddings joined to its applied_companies row.
+
+    Embeddings are kept as one contiguous, L2-normalized float32 matrix, so a search is a
+    single matrix-vector product. Updates build new arrays and swap them in under the lock;
+    searches work on the arrays they started with and never block on a refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._rows = []  # applied_companies row per matrix row, shaped like the vector search rows
+        self._positions = {}  # vector_id -> matrix row
+        self._names = []  # normalized company name per matrix row, for exact name matches
+        self._max_vector_id = 0
+        self._stats = {"searches": 0, "search_ms_total": 0.0, "rebuilds": 0, "updates": 0}
+        self.loaded = False
+
+    def _fetch(self, where="", params=()):
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(_ROW_QUERY + where + " ORDER BY ace.vector_id;", params)
+                return cursor.fetchall()
+
+    def rebuild(self):
+        """Reload every embedding from the database."""
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM applied_companies_embeddings;")
+                count = cursor.fetchone()[0]
+        if count > EMBEDDING_REPLICA_MAX_ROWS:
+            with self._lock:
+                self.loaded = False
+            logging.warning(f"Embedding replica disabled: {count} rows exceed EMBEDDING_REPLICA_MAX_ROWS ({EMBEDDING_REPLICA_MAX_ROWS}).")
+            return
+
+        rows = self._fetch()
+        matrix = _normalize_rows(np.asarray([row[1] for row in rows], dtype=np.float32)) if rows else np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._matrix = matrix
+            self._rows = [tuple(row[2:]) for row in rows]
+            self._names = [_name_key(row[3]) for row in rows]
+            self._positions = {row[0]: position for position, row in enumerate(rows)}
+            self._max_vector_id = rows[-1][0] if rows else 0
+            self._stats["rebuilds"] += 1
+            self.loaded = True
+        logging.info(f"Embedding replica loaded {len(rows)} embeddings.")
+
+    def apply_change(self, payload):
+        """
+        Change-listener callback: add new embeddings and refresh the rows of changed companies.
+
+        A None payload means notifications may have been missed, so the replica is rebuilt.
+        """
+        if payload is None or not self.loaded:
+            self.rebuild()
+            return
+        if payload.get('table') not in ('applied_companies', 'applied_companies_embeddings'):
+            return
+
+        rows = self._fetch("WHERE ace.vector_id > %s OR ac.id = ANY(%s)",
+                           (self._max_vector_id, list(payload.get('ids', []))))
+        if not rows:
+            return
+
+        with self._lock:
+            if len(self._positions) + len(rows) > EMBEDDING_REPLICA_MAX_ROWS:
+                self.loaded = False
+                logging.warning("Embedding replica disabled: EMBEDDING_REPLICA_MAX_ROWS reached.")
+                return
+
+            company_rows = list(self._rows)
+            names = list(self._names)
+            positions = dict(self._positions)
+            added = []
+            for row in rows:
+                if row[0] in positions:
+                    company_rows[positions[row[0]]] = tuple(row[2:])
+                    names[positions[row[0]]] = _name_key(row[3])
+                else:
+                    positions[row[0]] = len(company_rows)
+                    company_rows.append(tuple(row[2:]))
+                    names.append(_name_key(row[3]))
+                    added.append(row[1])
+
+            matrix = self._matrix
+            if added:
+                new_vectors = _normalize_rows(np.asarray(added, dtype=np.float32))
+                matrix = np.vstack([matrix, new_vectors]) if len(matrix) else new_vectors
+
+            self._matrix = matrix
+            self._rows = company_rows
+            self._names = names
+            self._positions = positions
+            self._max_vector_id = max(self._max_vector_id, rows[-1][0])
+            self._stats["updates"] += 1
+        logging.info(f"Embedding replica updated: {len(added)} new, {len(rows) - len(added)} refreshed.")
+
+    def search(self, query_vector, limit=1):
+        """
+        Rows nearest to query_vector by cosine distance, closest first, each ending with its
+        distance like the pgvector search.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            matrix, rows = self._matrix, self._rows
+        if not rows:
+            return []
+
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        scores = matrix @ (query_vector / np.linalg.norm(query_vector))
+        limit = min(limit, len(rows))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        results = [rows[i] + (float(1.0 - scores[i]),) for i in top]
+
+        with self._lock:
+            self._stats["searches"] += 1
+            self._stats["search_ms_total"] += (time.perf_counter() - started) * 1000
+        return results
+
+    def match_names(self, query):
+        """
+        Rows whose full company name appears as words in the query, longest name and latest
+        application first; the in-memory counterpart of an exact trigram hit.
+        """
+        with self._lock:
+            rows, names = self._rows, self._names
+        text = _name_key(query)
+        matches = {row[0]: row for row, name in zip(rows, names) if name.strip() and name in text}
+        return sorted(matches.values(), key=lambda row: (len(row[1]), row[4]), reverse=True)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["loaded"] = self.loaded
+            snapshot["rows"] = len(self._rows)
+            snapshot["memory_mb"] = round(self._matrix.nbytes / (1024 * 1024), 2)
+        snapshot["search_ms_avg"] = round(snapshot["search_ms_total"] / snapshot["searches"], 3) if snapshot["searches"] else 0.0
+        snapshot["search_ms_total"] = round(snapshot["search_ms_total"], 1)
+        return snapshot
+
+
+embedding_replica = EmbeddingReplica()
+
+
+def main():
+    """Time replica searches over synthetic 384-dimensional embeddings of a few table sizes."""
+    rng = np.random.default_rng(0)
+    for size in (1000, 10000, 100000):
+        replica = EmbeddingReplica()
+        replica._matrix = _normalize_rows(rng.standard_normal((size, 384), dtype=np.float32))
+        replica._rows = [(i, f"Company {i}", None, None, None, None) for i in range(size)]
+        replica.loaded = True
+
+        queries = rng.standard_normal((200, 384), dtype=np.float32)
+        latencies = []
+        for query_vector in queries:
+            begin = time.perf_counter()
+            replica.search(query_vector, limit=5)
+            latencies.append((time.perf_counter() - begin) * 1000)
+        latencies.sort()
+        print(f"{size:>6} rows ({replica.stats()['memory_mb']} MB): "
+              f"p50 {latencies[len(latencies) // 2]:.3f} ms, p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
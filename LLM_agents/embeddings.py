@@ -0,0 +1,276 @@
+import os
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Embedding model shared by vector search, routing, the semantic caches and the Prefect pipeline
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'thenlper/gte-small')
+
+# 'torch' runs the model with PyTorch; 'onnx' runs an int8 dynamically quantized ONNX export of
+# the same model with ONNX Runtime, which is faster and smaller on CPU-only hosts. The export
+# is created in EMBEDDING_ONNX_DIR on first use, for the instruction set in EMBEDDING_ONNX_QUANTIZATION
+# (arm64, avx2, avx512 or avx512_vnni).
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+EMBEDDING_ONNX_DIR = os.getenv('EMBEDDING_ONNX_DIR', os.path.join('models', 'gte-small-onnx'))
+EMBEDDING_ONNX_QUANTIZATION = os.getenv('EMBEDDING_ONNX_QUANTIZATION', 'avx2')
+
+# Minimum cosine similarity between the two backends' embeddings for the parity check to pass
+EMBEDDING_PARITY_MIN_COSINE = float(os.getenv('EMBEDDING_PARITY_MIN_COSINE', '0.99'))
+
+# Query embeddings kept in memory, keyed by the normalized query text
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '2048'))
+
+_model = None
+_model_lock = threading.Lock()
+_ready = threading.Event()
+_load_stats = {"load_ms": None, "warmup_ms": None}
+
+
+def _onnx_file_name():
+    return f"onnx/model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+
+
+def export_onnx_model():
+    """
+    Export EMBEDDING_MODEL_NAME to ONNX in EMBEDDING_ONNX_DIR and add an int8 dynamically
+    quantized copy. Run once at build time, or let the onnx backend do it on first load.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx")
+    model.save(EMBEDDING_ONNX_DIR)
+    export_dynamic_quantized_onnx_model(model, EMBEDDING_ONNX_QUANTIZATION, EMBEDDING_ONNX_DIR)
+    logging.info(f"Exported quantized ONNX model to {os.path.join(EMBEDDING_ONNX_DIR, _onnx_file_name())}.")
+
+
+def load_model(backend: str = EMBEDDING_BACKEND):
+    """Load the embedding model for a backend ('torch' or 'onnx'). Prefer get_model() outside benchmarks."""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == 'torch':
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    if backend == 'onnx':
+        if not os.path.exists(os.path.join(EMBEDDING_ONNX_DIR, _onnx_file_name())):
+            export_onnx_model()
+        return SentenceTransformer(EMBEDDING_ONNX_DIR, backend="onnx", model_kwargs={"file_name": _onnx_file_name()})
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def get_model():
+    """
+    Return the process-wide SentenceTransformer, loading it on first use.
+    sentence_transformers (and torch or ONNX Runtime) are only imported here, so importing this module is cheap.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                _model = load_model(EMBEDDING_BACKEND)
+                _load_stats["load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                logging.info(f"Loaded embedding model {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND}) in {_load_stats['load_ms']} ms.")
+    return _model
+
+
+def encode(texts, normalize_embeddings=False):
+    """Encode a list of texts into an array of embeddings. Blocking; run it off the event loop."""
+    return get_model().encode(texts, normalize_embeddings=normalize_embeddings)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial rewordings share a key."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', query.lower()).split())
+
+
+class QueryEmbeddingCache:
+    """Size-bounded LRU of normalized query -> float32 embedding, so repeat queries skip the encode."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def encode(self, query: str, normalize_embeddings=False):
+        """
+        Return the embedding of the normalized query, encoding it only on a miss. Entries hold
+        the raw vector; the L2-normalized form is derived from it, so both callers share one entry.
+        """
+        return self.encode_many([query], normalize_embeddings=normalize_embeddings)[0]
+
+    def encode_many(self, queries, normalize_embeddings=False):
+        """Embeddings for several queries, in order; all misses are encoded in one batch."""
+        keys = [normalize_query(query) for query in queries]
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    found[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            for key, vector in zip(missing, encode(missing)):
+                vector = np.asarray(vector, dtype=np.float32)
+                vector.setflags(write=False)
+                found[key] = vector
+            with self._lock:
+                for key in missing:
+                    self._stats["misses"] += 1
+                    self._entries[key] = found[key]
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+
+        vectors = [found[key] for key in keys]
+        if normalize_embeddings:
+            return [vector / np.linalg.norm(vector) for vector in vectors]
+        return vectors
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = round(snapshot["hits"] / lookups, 4) if lookups else 0.0
+        return snapshot
+
+
+query_embedding_cache = QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def encode_query(query: str, normalize_embeddings=False):
+    """Embedding of a user query through the shared LRU. Blocking on a miss; run it off the event loop."""
+    return query_embedding_cache.encode(query, normalize_embeddings=normalize_embeddings)
+
+
+def encode_queries(queries, normalize_embeddings=False):
+    """Embeddings of several user queries through the shared LRU, encoding the misses in one batch."""
+    return query_embedding_cache.encode_many(queries, normalize_embeddings=normalize_embeddings)
+
+
+def warmup():
+    """Load the model and run one encode so the first real query does not pay for either."""
+    started = time.perf_counter()
+    encode(["warmup"])
+    _load_stats["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    _ready.set()
+    logging.info(f"Embedding model warm after {_load_stats['warmup_ms']} ms.")
+
+
+def is_ready():
+    """True once warmup() has completed."""
+    return _ready.is_set()
+
+
+def get_embedding_stats():
+    return {"model": EMBEDDING_MODEL_NAME, "backend": EMBEDDING_BACKEND, "ready": is_ready(), **_load_stats}
+
+
+# Job-application style texts and queries used by the parity check and the benchmark
+SAMPLE_TEXTS = [
+    "Google https://google.com Software Engineer Applied on: 2024-05-01 Status: Applied",
+    "Stripe https://stripe.com Backend Engineer Applied on: 2024-04-12 Status: Rejected",
+    "Netflix https://netflix.com Data Scientist Applied on: 2024-03-30 Status: Interview scheduled",
+    "Amazon https://amazon.jobs Machine Learning Engineer Applied on: 2024-02-18 Status: Online assessment",
+    "Salesforce https://salesforce.com Product Manager Applied on: 2024-01-09 Status: Offer",
+    "What is the status of my application at Google?",
+    "Did I apply to Stripe? and when?",
+    "Any update on my Netflix application?",
+    "How many companies have I applied to?",
+    "Show a chart of applications per month",
+]
+
+
+def _rss_mb():
+    """Current resident set size of this process in MB (Linux)."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _benchmark_backend(backend, texts, single_runs=50, batch_runs=5):
+    """Load one backend in a fresh process and measure load time, RSS, latency and throughput."""
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    model = load_model(backend)
+    load_ms = (time.perf_counter() - started) * 1000
+    model.encode(texts)  # Warm up
+
+    latencies = []
+    for i in range(single_runs):
+        begin = time.perf_counter()
+        model.encode([texts[i % len(texts)]])
+        latencies.append((time.perf_counter() - begin) * 1000)
+    latencies.sort()
+
+    batch = texts * 20
+    begin = time.perf_counter()
+    for _ in range(batch_runs):
+        model.encode(batch, batch_size=32)
+    throughput = len(batch) * batch_runs / (time.perf_counter() - begin)
+
+    return {
+        "vectors": np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32),
+        "load_ms": round(load_ms, 1),
+        "rss_mb": round(_rss_mb() - rss_before, 1),
+        "latency_p50_ms": round(latencies[len(latencies) // 2], 2),
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "throughput_per_s": round(throughput, 1),
+    }
+
+
+def main():
+    """
+    Parity check and benchmark of the torch and onnx backends. Each backend runs in its own
+    spawned process so RSS is measured in isolation. Exits non-zero if parity fails.
+    """
+    import sys
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {}
+    for backend in ('torch', 'onnx'):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results[backend] = executor.submit(_benchmark_backend, backend, SAMPLE_TEXTS).result()
+
+    for backend, stats in results.items():
+        print(backend, {key: value for key, value in stats.items() if key != "vectors"})
+
+    torch_vectors, onnx_vectors = results['torch']['vectors'], results['onnx']['vectors']
+    cosines = np.sum(torch_vectors * onnx_vectors, axis=1)
+    # Nearest stored text for each query must not change between backends
+    documents, queries = slice(0, 5), slice(5, 8)
+    same_top1 = np.array_equal(
+        np.argmax(torch_vectors[queries] @ torch_vectors[documents].T, axis=1),
+        np.argmax(onnx_vectors[queries] @ onnx_vectors[documents].T, axis=1)
+    )
+    print(f"Cosine agreement: min {cosines.min():.4f}, mean {cosines.mean():.4f}; same top-1 neighbours: {same_top1}")
+
+    if cosines.min() < EMBEDDING_PARITY_MIN_COSINE or not same_top1:
+        print(f"Parity check FAILED (minimum cosine {EMBEDDING_PARITY_MIN_COSINE})")
+        sys.exit(1)
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import time
+import logging
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+import orjson
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Postgres type OIDs (cursor.description type_code) whose Python values orjson cannot write
+# as-is. Everything else (text, integers, floats, booleans, dates, timestamps, UUIDs) passes
+# straight through; orjson writes timestamps in the same ISO 8601 form as isoformat().
+NUMERIC_OID = 1700
+INTERVAL_OID = 1186
+MONEY_OID = 790
+
+_TYPE_ENCODERS = {
+    NUMERIC_OID: float,
+    INTERVAL_OID: str,
+    MONEY_OID: str,
+}
+
+
+def _default(value):
+    """Fallback for values whose column type gave no encoder (e.g. a NUMERIC inside an array)."""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def dumps(obj) -> bytes:
+    """Serialize obj to JSON bytes with orjson."""
+    return orjson.dumps(obj, default=_default)
+
+
+def column_encoders(description):
+    """Map a cursor description to one encoder per column (None when no conversion is needed)."""
+    return [_TYPE_ENCODERS.get(column[1]) for column in description]
+
+
+def encode_row(row, encoders):
+    """Apply the per-column encoders to a row, leaving NULLs alone."""
+    return [value if encoder is None or value is None else encoder(value)
+            for value, encoder in zip(row, encoders)]
+
+
+def rows_to_json(headers, rows, encoders=None) -> bytes:
+    """Serialize rows as a JSON array of {column: value} records, the shape the popup renders."""
+    if encoders is not None and any(encoders):
+        rows = (encode_row(row, encoders) for row in rows)
+    return orjson.dumps([dict(zip(headers, row)) for row in rows], default=_default)
+
+
+def format_applied_date(applied_date):
+    # If applied_date is already a datetime object, just format it directly
+    if isinstance(applied_date, datetime):
+        return applied_date.strftime("%B %d, %Y, %I:%M %p")
+
+    # If applied_date is a string, try to parse it
+    if isinstance(applied_date, str):
+        try:
+            parsed_date = datetime.fromisoformat(applied_date)
+            return parsed_date.strftime("%B %d, %Y, %I:%M %p")
+        except ValueError:
+            # If the string is not in ISO format, return it as is or handle it
+            return applied_date
+
+    # If applied_date is None or unrecognized, return a default message
+    return "Unknown date"
+
+
+def _dataframe_path(headers, rows):
+    """The previous serializer: DataFrame, per-row datetime apply, to_dict, stdlib JSON."""
+    import json
+    import pandas as pd
+
+    table = pd.DataFrame(rows, columns=headers)
+    for column in table.columns:
+        if isinstance(table[column].iloc[0], (datetime, pd.Timestamp)):
+            table[column] = table[column].apply(lambda x: x.isoformat() if x else None)
+    return json.dumps(table.to_dict(orient='records'), ensure_ascii=False,
+                      allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def main():
+    """Benchmark the DataFrame serializer against rows_to_json on a synthetic query result."""
+    headers = ["company_name", "job_position", "applied_date", "application_status"]
+    description = [("company_name", 1043), ("job_position", 1043), ("applied_date", 1184), ("application_status", 1043)]
+    start = datetime(2024, 1, 1, 9, 30, tzinfo=timezone.utc)
+
+    for size in (5, 500, 5000):
+        rows = [(f"Company {i}", "Software Engineer", start + timedelta(hours=i), "Applied") for i in range(size)]
+        encoders = column_encoders(description)
+        runs = max(10, 20000 // size)
+
+        timings = {}
+        for name, serialize in (("dataframe", lambda: _dataframe_path(headers, rows)),
+                                ("rows_to_json", lambda: rows_to_json(headers, rows, encoders))):
+            begin = time.perf_counter()
+            for _ in range(runs):
+                serialize()
+            timings[name] = (time.perf_counter() - begin) / runs * 1000
+
+        assert orjson.loads(_dataframe_path(headers, rows)) == orjson.loads(rows_to_json(headers, rows, encoders))
+        print(f"{size:>5} rows: dataframe {timings['dataframe']:.3f} ms, "
+              f"rows_to_json {timings['rows_to_json']:.3f} ms "
+              f"({timings['dataframe'] / timings['rows_to_json']:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
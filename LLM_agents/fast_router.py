@@ -0,0 +1,151 @@
+import os
+import re
+import threading
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from LLM_agents.db_pool import get_connection
+from LLM_agents.embeddings import encode
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Minimum cosine similarity to the nearest exemplar, and the lead it needs over the best
+# exemplar of any other agent, before the local decision is trusted without the LLM
+FAST_ROUTER_THRESHOLD = float(os.getenv('FAST_ROUTER_THRESHOLD', '0.88'))
+FAST_ROUTER_MARGIN = float(os.getenv('FAST_ROUTER_MARGIN', '0.03'))
+
+# Company names shorter than this are too likely to appear as ordinary words
+MIN_COMPANY_NAME_LENGTH = 3
+
+# Labeled queries mirroring the routing rules in agent_selector_assistant.generate_prompt
+ROUTER_EXEMPLARS = {
+    'vector_search_agent': [
+        "What is the status of my application at Google?",
+        "Did I apply to Apple? and when?",
+        "Have I applied to Microsoft?",
+        "When did I apply to Amazon?",
+        "What position did I apply for at Netflix?",
+        "Did Meta reject me?",
+        "Any update on my Stripe application?",
+        "Tell me about my application to Salesforce",
+    ],
+    'text_to_sql_agent': [
+        "Show me all the companies I've applied to in the last month.",
+        "How many companies have I applied to?",
+        "How many applications were rejected?",
+        "Show my latest 5 job applications",
+        "Visualize my applications by status",
+        "List the companies where I have next steps",
+        "How many jobs did I apply to this week?",
+        "Show a chart of applications per month",
+    ],
+    'invalid question': [
+        "What's the weather like?",
+        "Tell me a joke",
+        "Who won the game last night?",
+        "What can you do?",
+        "Write me a poem",
+        "What is the capital of France?",
+        "Hello",
+        "How do I cook pasta?",
+    ],
+}
+
+
+class FastRouter:
+    """
+    Local router that answers the common select_agent decisions without an LLM call.
+
+    A query naming a company already in applied_companies goes straight to the vector search
+    agent. Otherwise the query embedding is compared with labeled exemplars, and the result is
+    only used when it is both similar enough and clearly ahead of the other agents.
+    """
+
+    def __init__(self, threshold=FAST_ROUTER_THRESHOLD, margin=FAST_ROUTER_MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._exemplar_vectors = None
+        self._exemplar_labels = None
+        self._company_pattern = None
+        self._stats = {"fast_path": 0, "llm_fallback": 0, "company_match": 0, "exemplar_match": 0}
+
+    def _exemplars(self):
+        """Encode the exemplars once, on first use, as L2-normalized rows."""
+        if self._exemplar_vectors is None:
+            labels, texts = [], []
+            for label, examples in ROUTER_EXEMPLARS.items():
+                labels.extend([label] * len(examples))
+                texts.extend(examples)
+            self._exemplar_vectors = encode(texts, normalize_embeddings=True)
+            self._exemplar_labels = np.array(labels)
+        return self._exemplar_vectors, self._exemplar_labels
+
+    def warmup(self):
+        """Encode the exemplars ahead of the first query."""
+        self._exemplars()
+
+    def refresh_company_names(self, payload=None):
+        """Reload applied company names; also used as a change-listener callback."""
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT DISTINCT company_name FROM applied_companies;")
+                names = {row[0].strip().lower() for row in cursor.fetchall() if row[0]}
+
+        names = sorted((n for n in names if len(n) >= MIN_COMPANY_NAME_LENGTH), key=len, reverse=True)
+        pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, names)) + r')\b') if names else None
+        with self._lock:
+            self._company_pattern = pattern
+        logging.info(f"Fast router loaded {len(names)} company names.")
+
+    def _record(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def match_company(self, user_query: str):
+        """
+        Return 'vector_search_agent' when the query names an applied company, else None.
+        Needs no query embedding, so callers can try it before encoding.
+        """
+        if self._company_pattern is not None and self._company_pattern.search(user_query.lower()):
+            self._record("company_match")
+            self._record("fast_path")
+            return 'vector_search_agent'
+        return None
+
+    def match_exemplars(self, user_query: str, query_vector=None):
+        """
+        Return the agent of the nearest exemplar when confident, or None to defer to the LLM.
+        Pass a normalized query_vector if one was already computed; otherwise this encodes (blocking).
+        """
+        vectors, labels = self._exemplars()
+        if query_vector is None:
+            query_vector = encode([user_query], normalize_embeddings=True)[0]
+        similarities = vectors @ query_vector
+
+        best = int(np.argmax(similarities))
+        best_label = labels[best]
+        runner_up = similarities[labels != best_label].max()
+
+        if similarities[best] >= self.threshold and similarities[best] - runner_up >= self.margin:
+            self._record("exemplar_match")
+            self._record("fast_path")
+            logging.info(f"Fast router chose {best_label} (similarity {similarities[best]:.3f}).")
+            return str(best_label)
+
+        self._record("llm_fallback")
+        return None
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        total = snapshot["fast_path"] + snapshot["llm_fallback"]
+        snapshot["fast_path_ratio"] = round(snapshot["fast_path"] / total, 4) if total else 0.0
+        return snapshot
+
+
+fast_router = FastRouter()
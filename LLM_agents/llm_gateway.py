@@ -0,0 +1,313 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import logging
+from contextlib import asynccontextmanager, contextmanager
+import httpx
+import openai
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# OpenAI API key; OPENAI_BASE_URL points the gateway at a compatible server (e.g. a local stand-in)
+openai_api_key = os.getenv('OPENAI_API_KEY')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+
+# HTTP connection pool shared by every call, kept alive between requests and streams
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('LLM_KEEPALIVE_EXPIRY_SECONDS', '60'))
+
+# Per-request timeouts; a streamed answer must produce a chunk at least every LLM_TIMEOUT_SECONDS
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', '5'))
+
+# Calls in flight per model; further calls wait for a slot instead of piling onto rate limits.
+# Streams have their own slots: a stream holds one for as long as the client takes to read the
+# answer, so sharing them would let slow readers block routing and SQL generation. A call that
+# waits longer than LLM_QUEUE_TIMEOUT_SECONDS for a slot fails with APITimeoutError.
+LLM_MODEL_CONCURRENCY = int(os.getenv('LLM_MODEL_CONCURRENCY', '8'))
+LLM_STREAM_CONCURRENCY = int(os.getenv('LLM_STREAM_CONCURRENCY', '8'))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', str(LLM_TIMEOUT_SECONDS)))
+
+# Retries for timeouts, connection errors, 429s and 5xx, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv('LLM_RETRY_BASE_DELAY_SECONDS', '0.5'))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv('LLM_RETRY_MAX_DELAY_SECONDS', '8'))
+
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_async_client = None
+_sync_client = None
+_client_lock = threading.Lock()
+
+_async_semaphores = {}
+_sync_semaphores = {}
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS
+    )
+
+
+def _timeout():
+    return httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def get_async_client():
+    """Return the shared AsyncOpenAI client, creating it on first use."""
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            # Retries are done here, with jitter and metrics, rather than inside the SDK
+            _async_client = openai.AsyncOpenAI(
+                api_key=openai_api_key,
+                base_url=OPENAI_BASE_URL,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+            )
+        return _async_client
+
+
+def get_sync_client():
+    """Return the shared OpenAI client for synchronous callers such as the Prefect pipeline."""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None:
+            _sync_client = openai.OpenAI(
+                api_key=openai_api_key,
+                base_url=OPENAI_BASE_URL,
+                max_retries=0,
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout())
+            )
+        return _sync_client
+
+
+async def close_gateway():
+    """Close the pooled HTTP connections."""
+    global _async_client, _sync_client
+    with _client_lock:
+        async_client, sync_client = _async_client, _sync_client
+        _async_client = _sync_client = None
+    if async_client is not None:
+        await async_client.close()
+    if sync_client is not None:
+        sync_client.close()
+
+
+def _async_semaphore(model, stream=False):
+    key = (model, stream)
+    if key not in _async_semaphores:
+        _async_semaphores[key] = asyncio.Semaphore(LLM_STREAM_CONCURRENCY if stream else LLM_MODEL_CONCURRENCY)
+    return _async_semaphores[key]
+
+
+def _sync_semaphore(model):
+    with _client_lock:
+        if model not in _sync_semaphores:
+            _sync_semaphores[model] = threading.BoundedSemaphore(LLM_MODEL_CONCURRENCY)
+        return _sync_semaphores[model]
+
+
+def _queue_timeout(client, model):
+    _record(model, errors=1, queue_timeouts=1)
+    logging.warning(f"No {model} slot freed up within {LLM_QUEUE_TIMEOUT_SECONDS}s")
+    return openai.APITimeoutError(request=httpx.Request("POST", f"{client.base_url}chat/completions"))
+
+
+@asynccontextmanager
+async def _async_slot(client, model, stream=False):
+    """Hold a per-model slot, waiting at most LLM_QUEUE_TIMEOUT_SECONDS for one."""
+    semaphore = _async_semaphore(model, stream)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), LLM_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise _queue_timeout(client, model) from None
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+@contextmanager
+def _sync_slot(client, model):
+    """Blocking counterpart of _async_slot."""
+    semaphore = _sync_semaphore(model)
+    if not semaphore.acquire(timeout=LLM_QUEUE_TIMEOUT_SECONDS):
+        raise _queue_timeout(client, model)
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def _backoff(attempt):
+    """Full jitter: a random delay up to the exponential cap, so retries from concurrent calls spread out."""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+
+
+def _record(model, **values):
+    with _stats_lock:
+        stats = _stats.setdefault(model, {
+            "calls": 0, "errors": 0, "retries": 0, "queue_timeouts": 0,
+            "latency_ms_total": 0.0, "queue_ms_total": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+        })
+        for key, value in values.items():
+            stats[key] += value
+
+
+def _record_usage(model, usage):
+    if usage is not None:
+        _record(model, prompt_tokens=usage.prompt_tokens or 0, completion_tokens=usage.completion_tokens or 0)
+
+
+def get_llm_stats():
+    """Per-model call counts, latency and token usage."""
+    with _stats_lock:
+        snapshot = {model: dict(values) for model, values in _stats.items()}
+    for values in snapshot.values():
+        values["latency_ms_avg"] = round(values["latency_ms_total"] / values["calls"], 1) if values["calls"] else 0.0
+        values["queue_ms_avg"] = round(values["queue_ms_total"] / values["calls"], 1) if values["calls"] else 0.0
+        values["latency_ms_total"] = round(values["latency_ms_total"], 1)
+        values["queue_ms_total"] = round(values["queue_ms_total"], 1)
+    return snapshot
+
+
+async def chat_completion(model: str, messages, **kwargs):
+    """
+    Create a chat completion through the shared client, waiting for a per-model slot and
+    retrying transient failures. Raises the last OpenAI error once retries are exhausted,
+    or APITimeoutError if no slot frees up within LLM_QUEUE_TIMEOUT_SECONDS.
+    """
+    client = get_async_client()
+    queued_at = time.perf_counter()
+    async with _async_slot(client, model):
+        started = time.perf_counter()
+        _record(model, calls=1, queue_ms_total=(started - queued_at) * 1000)
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+                    _record_usage(model, response.usage)
+                    return response
+                except RETRYABLE_ERRORS as e:
+                    if attempt == LLM_MAX_RETRIES:
+                        raise
+                    delay = _backoff(attempt)
+                    logging.warning(f"LLM call to {model} failed ({e}); retrying in {delay:.2f}s")
+                    _record(model, retries=1)
+                    await asyncio.sleep(delay)
+        except Exception:
+            _record(model, errors=1)
+            raise
+        finally:
+            _record(model, latency_ms_total=(time.perf_counter() - started) * 1000)
+
+
+async def stream_chat_completion(model: str, messages, **kwargs):
+    """
+    Stream a chat completion, yielding content deltas. Opening the stream is retried like
+    chat_completion; once text has been yielded a failure is raised to the caller instead.
+    The stream slot, separate from chat_completion's, is held until the stream ends.
+    """
+    client = get_async_client()
+    queued_at = time.perf_counter()
+    async with _async_slot(client, model, stream=True):
+        started = time.perf_counter()
+        _record(model, calls=1, queue_ms_total=(started - queued_at) * 1000)
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    stream = await client.chat.completions.create(
+                        model=model, messages=messages, stream=True,
+                        stream_options={"include_usage": True}, **kwargs
+                    )
+                    break
+                except RETRYABLE_ERRORS as e:
+                    if attempt == LLM_MAX_RETRIES:
+                        raise
+                    delay = _backoff(attempt)
+                    logging.warning(f"LLM stream to {model} failed ({e}); retrying in {delay:.2f}s")
+                    _record(model, retries=1)
+                    await asyncio.sleep(delay)
+
+            async for chunk in stream:
+                # The final chunk carries token usage and no choices
+                _record_usage(model, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+        except Exception:
+            _record(model, errors=1)
+            raise
+        finally:
+            _record(model, latency_ms_total=(time.perf_counter() - started) * 1000)
+
+
+def chat_completion_sync(model: str, messages, **kwargs):
+    """Blocking counterpart of chat_completion for code that does not run an event loop."""
+    client = get_sync_client()
+    queued_at = time.perf_counter()
+    with _sync_slot(client, model):
+        started = time.perf_counter()
+        _record(model, calls=1, queue_ms_total=(started - queued_at) * 1000)
+        try:
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+                    _record_usage(model, response.usage)
+                    return response
+                except RETRYABLE_ERRORS as e:
+                    if attempt == LLM_MAX_RETRIES:
+                        raise
+                    delay = _backoff(attempt)
+                    logging.warning(f"LLM call to {model} failed ({e}); retrying in {delay:.2f}s")
+                    _record(model, retries=1)
+                    time.sleep(delay)
+        except Exception:
+            _record(model, errors=1)
+            raise
+        finally:
+            _record(model, latency_ms_total=(time.perf_counter() - started) * 1000)
+
+
+async def _smoke_test(model, concurrency):
+    messages = [{"role": "user", "content": "Reply with the single word: ok"}]
+    responses = await asyncio.gather(
+        *(chat_completion(model, messages, max_tokens=5, temperature=0) for _ in range(concurrency))
+    )
+    print(f"Completion: {responses[0].choices[0].message.content!r}")
+    print("Stream: " + "".join([text async for text in stream_chat_completion(model, messages, max_tokens=5)]))
+    await close_gateway()
+
+
+def main():
+    """
+    Send a few concurrent calls and one stream through the gateway and print its metrics.
+    Set OPENAI_BASE_URL to run it against a local OpenAI-compatible stand-in server.
+    """
+    model = os.getenv('LLM_SMOKE_TEST_MODEL', 'gpt-4o')
+    asyncio.run(_smoke_test(model, concurrency=LLM_MODEL_CONCURRENCY * 2))
+    for name, values in get_llm_stats().items():
+        print(name, values)
+
+
+if __name__ == "__main__":
+    main()
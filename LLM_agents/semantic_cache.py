@@ -0,0 +1,102 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from LLM_agents.embeddings import normalize_query, query_embedding_cache
+
+# Load environment variables from .env file
+load_dotenv()
+
+ROUTER_CACHE_SIZE = int(os.getenv('ROUTER_CACHE_SIZE', '1000'))
+ROUTER_CACHE_THRESHOLD = float(os.getenv('ROUTER_CACHE_THRESHOLD', '0.95'))
+SQL_CACHE_SIZE = int(os.getenv('SQL_CACHE_SIZE', '1000'))
+SQL_CACHE_THRESHOLD = float(os.getenv('SQL_CACHE_THRESHOLD', '0.97'))
+
+
+def query_signature(normalized_query: str) -> tuple:
+    """
+    Numbers in a query usually change its meaning ('last 5' vs 'last 10') while barely moving
+    its embedding, so semantic matches are only allowed between queries with the same numbers.
+    """
+    return tuple(re.findall(r'\d+', normalized_query))
+
+
+def encode_query(query: str):
+    """Encode a query as an L2-normalized vector (cached). Blocking on a miss; run it off the event loop."""
+    return query_embedding_cache.encode(query, normalize_embeddings=True)
+
+
+class SemanticCache:
+    """
+    Size-bounded LRU cache of LLM outputs keyed by the normalized query, which also answers
+    near-duplicate queries whose embedding is within `threshold` cosine similarity of a cached one.
+    """
+
+    def __init__(self, maxsize: int, threshold: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._entries = OrderedDict()  # normalized query -> (signature, vector, value)
+        self._matrix = None  # Stacked vectors, rebuilt lazily after the entries change
+        self._keys = []
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+
+    def lookup_exact(self, query: str):
+        """Return the value cached for this exact normalized query, without encoding it."""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._stats["exact_hits"] += 1
+            return entry[2]
+
+    def lookup_similar(self, query: str, vector):
+        """Return the value of the most similar cached query above the threshold, or None."""
+        key = normalize_query(query)
+        signature = query_signature(key)
+        with self._lock:
+            if self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[k][1] for k in self._keys])
+                similarities = self._matrix @ vector
+                for index in np.argsort(similarities)[::-1]:
+                    if similarities[index] < self.threshold:
+                        break
+                    match = self._keys[index]
+                    entry = self._entries.get(match)
+                    if entry is not None and entry[0] == signature:
+                        self._entries.move_to_end(match)
+                        self._stats["semantic_hits"] += 1
+                        return entry[2]
+            self._stats["misses"] += 1
+            return None
+
+    def store(self, query: str, vector, value):
+        """Cache value for query, evicting the least recently used entry when full."""
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (query_signature(key), np.asarray(vector, dtype=np.float32), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+        lookups = snapshot["exact_hits"] + snapshot["semantic_hits"] + snapshot["misses"]
+        hits = snapshot["exact_hits"] + snapshot["semantic_hits"]
+        snapshot["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return snapshot
+
+
+# Agent choices made by the LLM router, and {"sql", "chart_type"} responses from the SQL agent
+router_cache = SemanticCache(ROUTER_CACHE_SIZE, ROUTER_CACHE_THRESHOLD)
+sql_cache = SemanticCache(SQL_CACHE_SIZE, SQL_CACHE_THRESHOLD)
@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import logging
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Tables generated SQL may read, comma separated
+SQL_ALLOWED_TABLES = {t.strip().lower() for t in os.getenv('SQL_ALLOWED_TABLES', 'applied_companies').split(',') if t.strip()}
+
+# Plans estimated above either threshold are rejected before the query runs
+SQL_MAX_PLAN_COST = float(os.getenv('SQL_MAX_PLAN_COST', '500000'))
+SQL_MAX_PLAN_ROWS = float(os.getenv('SQL_MAX_PLAN_ROWS', '1000000'))
+
+# Per-query statement_timeout, and the LIMIT appended to queries that have none
+SQL_STATEMENT_TIMEOUT_MS = int(os.getenv('SQL_STATEMENT_TIMEOUT_MS', '5000'))
+SQL_DEFAULT_LIMIT = int(os.getenv('SQL_DEFAULT_LIMIT', '100'))
+
+# Keywords that write, change session state or lock rows; none belong in a read-only report
+FORBIDDEN_KEYWORDS = {
+    'insert', 'update', 'delete', 'merge', 'upsert', 'drop', 'alter', 'create', 'truncate',
+    'grant', 'revoke', 'copy', 'call', 'do', 'execute', 'prepare', 'deallocate', 'vacuum',
+    'analyze', 'cluster', 'reindex', 'refresh', 'lock', 'listen', 'notify', 'unlisten',
+    'set', 'reset', 'discard', 'comment', 'security', 'into', 'load', 'import',
+}
+
+# Functions generated SQL may call; anything else (pg_read_file, table_to_xml, dblink, ...) is
+# rejected. SQL_EXTRA_FUNCTIONS adds to the list, comma separated.
+ALLOWED_FUNCTIONS = {
+    # aggregates and window functions
+    'count', 'sum', 'avg', 'min', 'max', 'array_agg', 'string_agg', 'bool_and', 'bool_or', 'every',
+    'stddev', 'stddev_pop', 'stddev_samp', 'variance', 'var_pop', 'var_samp', 'corr', 'mode',
+    'percentile_cont', 'percentile_disc', 'json_agg', 'jsonb_agg', 'grouping', 'row_number', 'rank',
+    'dense_rank', 'percent_rank', 'cume_dist', 'ntile', 'lag', 'lead', 'first_value', 'last_value',
+    'nth_value',
+    # conditionals and casts
+    'coalesce', 'nullif', 'greatest', 'least', 'cast',
+    # strings
+    'lower', 'upper', 'initcap', 'length', 'char_length', 'character_length', 'trim', 'btrim', 'ltrim',
+    'rtrim', 'substring', 'substr', 'position', 'strpos', 'replace', 'translate', 'overlay', 'concat',
+    'concat_ws', 'left', 'right', 'lpad', 'rpad', 'split_part', 'starts_with', 'reverse', 'repeat',
+    'regexp_replace', 'regexp_match', 'regexp_matches', 'format', 'to_char', 'to_number',
+    # numbers
+    'abs', 'round', 'ceil', 'ceiling', 'floor', 'trunc', 'mod', 'div', 'power', 'sqrt', 'sign',
+    # dates
+    'now', 'date', 'date_trunc', 'date_part', 'extract', 'age', 'to_date', 'to_timestamp', 'make_date',
+    'make_interval', 'justify_days', 'justify_interval',
+}
+ALLOWED_FUNCTIONS |= {f.strip().lower() for f in os.getenv('SQL_EXTRA_FUNCTIONS', '').split(',') if f.strip()}
+
+# Keywords that may be followed by a parenthesis without being a function call
+SYNTAX_WORDS = {
+    'select', 'with', 'recursive', 'as', 'from', 'join', 'lateral', 'only', 'on', 'using', 'where',
+    'having', 'group', 'by', 'rollup', 'cube', 'sets', 'over', 'filter', 'within', 'in', 'exists',
+    'any', 'all', 'some', 'values', 'row', 'array', 'and', 'or', 'not', 'is', 'between', 'like',
+    'ilike', 'similar', 'to', 'escape', 'case', 'when', 'then', 'else', 'end', 'distinct', 'union',
+    'intersect', 'except', 'limit', 'offset', 'fetch', 'first', 'next', 'rows',
+}
+
+# Keywords that end a FROM list; commas after them no longer introduce tables
+CLAUSE_KEYWORDS = {
+    'where', 'group', 'having', 'window', 'order', 'limit', 'offset', 'fetch', 'for',
+    'union', 'intersect', 'except', 'on', 'using', 'returning',
+}
+JOIN_KEYWORDS = {'join'}
+
+_TOKEN_PATTERN = re.compile(r"""
+    [Ee]'(?:[^'\\]|\\.|'')*'                                # escape string literal
+  | \$((?:[A-Za-z_]\w*)?)\$.*?\$\1\$                        # dollar-quoted string
+  | '(?:[^']|'')*'                                          # string literal
+  | "(?:[^"]|"")+"(?:\."(?:[^"]|"")+"|\.[A-Za-z_][\w$]*)*   # quoted (possibly qualified) identifier
+  | [A-Za-z_][\w$]*(?:\.(?:[A-Za-z_][\w$]*|"(?:[^"]|"")+"))*  # word or qualified name
+  | \d+(?:\.\d+)?                                           # number
+  | --|/\*|\*/|::|<=|>=|<>|!=|\|\|                          # comments and operators
+  | \S                                                      # any other single character
+""", re.VERBOSE | re.DOTALL)
+
+
+class SQLGuardError(ValueError):
+    """Raised when generated SQL is not a safe, bounded read of the known tables."""
+
+
+def _tokenize(sql_query):
+    return [match.group(0) for match in _TOKEN_PATTERN.finditer(sql_query)]
+
+
+def _table_name(token):
+    """Lowercase a table reference and drop quoting and the public schema."""
+    name = token.replace('"', '').lower()
+    return name[len('public.'):] if name.startswith('public.') else name
+
+
+def _function_name(token):
+    """Lowercase a called name and drop quoting and the pg_catalog schema."""
+    name = token.replace('"', '').lower()
+    return name[len('pg_catalog.'):] if name.startswith('pg_catalog.') else name
+
+
+def _closing_paren(tokens, start):
+    """Index of the parenthesis closing the one at tokens[start]."""
+    depth = 0
+    for i in range(start, len(tokens)):
+        depth += {'(': 1, ')': -1}.get(tokens[i], 0)
+        if depth == 0:
+            return i
+    return len(tokens) - 1
+
+
+def _after_cte_name(tokens, i):
+    """Index just past tokens[i] and its column list when it names a CTE, else None."""
+    if i == 0 or tokens[i - 1].lower() not in ('with', 'recursive', ',') or i + 1 >= len(tokens):
+        return None
+    after = i + 1
+    if tokens[i + 1] == '(':
+        after = _closing_paren(tokens, i + 1) + 1
+        if not all(t == ',' or t[0].isalpha() or t[0] in ('_', '"') for t in tokens[i + 2:after - 1]):
+            return None
+    if tokens[after:after + 2] and tokens[after].lower() == 'as' and tokens[after + 1:after + 2] == ['(']:
+        return after
+    return None
+
+
+def _cte_names(tokens):
+    """Names defined by WITH name [(columns)] AS ( ... ) at any level."""
+    return {_table_name(token) for i, token in enumerate(tokens) if _after_cte_name(tokens, i) is not None}
+
+
+def _is_call(tokens, i):
+    """Whether tokens[i], followed by a parenthesis, calls a function."""
+    token = tokens[i]
+    if not (token[0].isalpha() or token[0] in ('_', '"')):
+        return False
+    if token[0] != '"' and token.lower() in SYNTAX_WORDS:
+        return False
+    # Type modifiers (::numeric(10, 2), CAST(x AS varchar(20))) and alias column lists
+    if i > 0 and tokens[i - 1].lower() in ('::', 'as'):
+        return False
+    return _after_cte_name(tokens, i) is None
+
+
+def validate_sql(sql_query: str, default_limit: int = SQL_DEFAULT_LIMIT) -> str:
+    """
+    Check that sql_query is a single SELECT (or WITH ... SELECT) that reads only the allowed
+    tables, and return it with LIMIT default_limit appended when the outermost query has none.
+
+    Raises:
+        SQLGuardError: if the statement is anything else
+    """
+    statement = sql_query.strip().rstrip(';').strip()
+    tokens = _tokenize(statement)
+    if not tokens:
+        raise SQLGuardError("Empty SQL query")
+
+    words = [token.lower() for token in tokens]
+    if words[0] not in ('select', 'with'):
+        raise SQLGuardError("Only SELECT queries are allowed")
+
+    allowed_tables = SQL_ALLOWED_TABLES | _cte_names(tokens)
+
+    # One frame per parenthesis level: whether it holds a query, and whether we are in its FROM list
+    frames = [{"query": True, "from": False}]
+    expect_table = False
+    has_limit = False
+
+    for i, (token, word) in enumerate(zip(tokens, words)):
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else ''
+
+        if token in (';', '--', '/*', '*/'):
+            raise SQLGuardError("Multiple statements and comments are not allowed")
+        if word in FORBIDDEN_KEYWORDS:
+            raise SQLGuardError(f"Keyword not allowed: {word.upper()}")
+        if next_token == '(' and _is_call(tokens, i) and _function_name(token) not in ALLOWED_FUNCTIONS:
+            raise SQLGuardError(f"Function not allowed: {_function_name(token)}")
+        if word == 'for' and next_token.lower() in ('update', 'share', 'no', 'key'):
+            raise SQLGuardError("Row locking is not allowed")
+
+        frame = frames[-1]
+        if token == '(':
+            frames.append({"query": next_token.lower() in ('select', 'with'), "from": False})
+            expect_table = False
+            continue
+        if token == ')':
+            if len(frames) > 1:
+                frames.pop()
+            continue
+
+        if expect_table:
+            expect_table = False
+            if word in ('lateral', 'only'):
+                expect_table = True
+            elif token[0].isalpha() or token[0] in ('_', '"'):
+                if next_token == '(':
+                    raise SQLGuardError(f"Table functions are not allowed: {word}")
+                if _table_name(token) not in allowed_tables:
+                    raise SQLGuardError(f"Table not allowed: {token}")
+            continue
+
+        if not frame["query"]:
+            continue
+        if word == 'from':
+            frame["from"] = True
+            expect_table = True
+        elif word in JOIN_KEYWORDS:
+            expect_table = True
+        elif token == ',' and frame["from"]:
+            expect_table = True
+        elif word in CLAUSE_KEYWORDS:
+            frame["from"] = False
+            if len(frames) == 1 and word in ('limit', 'fetch'):
+                has_limit = True
+
+    if not has_limit:
+        statement = f"{statement}\nLIMIT {default_limit}"
+        logging.info(f"Injected LIMIT {default_limit} into generated SQL.")
+    return statement
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def check_plan(cursor, sql_query: str):
+    """
+    EXPLAIN the query (without running it) and reject it when the estimated total cost, or the
+    rows estimated for any plan node, exceeds the configured thresholds.
+    """
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql_query}")
+    explain = cursor.fetchone()[0]
+    if isinstance(explain, str):
+        explain = json.loads(explain)
+
+    plan = explain[0]['Plan']
+    total_cost = plan['Total Cost']
+    max_rows = max(node.get('Plan Rows', 0) for node in _plan_nodes(plan))
+    logging.info(f"Generated SQL plan: cost {total_cost}, max rows {max_rows}")
+
+    if total_cost > SQL_MAX_PLAN_COST:
+        raise SQLGuardError(f"Query plan too expensive (cost {total_cost:.0f} > {SQL_MAX_PLAN_COST:.0f})")
+    if max_rows > SQL_MAX_PLAN_ROWS:
+        raise SQLGuardError(f"Query plan too large ({max_rows:.0f} rows > {SQL_MAX_PLAN_ROWS:.0f})")
+
+
+def guard_query(conn, sql_query: str, default_limit: int = SQL_DEFAULT_LIMIT) -> str:
+    """
+    Validate generated SQL and open a read-only transaction with a statement_timeout on conn,
+    then EXPLAIN-check it. Returns the SQL to execute on conn inside that transaction; the
+    caller ends it with conn.rollback() once the rows are read.
+
+    Raises:
+        SQLGuardError: if the statement or its plan is rejected
+    """
+    guarded_sql = validate_sql(sql_query, default_limit)
+    with conn.cursor() as cursor:
+        # Must be the first statement of the transaction; SET LOCAL ends with it
+        cursor.execute("SET TRANSACTION READ ONLY")
+        cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(SQL_STATEMENT_TIMEOUT_MS),))
+        check_plan(cursor, guarded_sql)
+    return guarded_sql
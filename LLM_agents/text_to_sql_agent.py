@@ -1,15 +1,22 @@
 import os
-import psycopg2
 from psycopg2 import Error
 import openai
 from dotenv import load_dotenv
+from LLM_agents.db_pool import acquire_connection, release_connection
+from LLM_agents.semantic_cache import sql_cache, encode_query
+from LLM_agents.llm_gateway import chat_completion
+from LLM_agents.sql_guard import guard_query
 import logging
 import openai
 import json
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import List, Tuple, Optional
+import uuid
+import asyncio
+from typing import List, Tuple, Optional, TYPE_CHECKING
+from LLM_agents.chart_renderer import draw_chart
+from LLM_agents.fast_json import column_encoders, encode_row, rows_to_json, dumps
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,41 +24,36 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Load environment variables from .env file
 load_dotenv()
 
-# PostgreSQL connection parameters
-DB_HOST_NAME = os.getenv('DB_HOST_NAME')
-MAINTENANCE_DB = os.getenv('MAINTENANCE_DB')
-DB_USERNAME = os.getenv('DB_USERNAME')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-
 # OpenAI API key
 openai_api_key = os.getenv('OPENAI_API_KEY')
 
 if not openai_api_key:
     raise ValueError("OpenAI API key not found. Make sure it is set in the .env file.")
 
-# Initialize OpenAI API
-client = openai.OpenAI(
-    api_key=openai_api_key,
-)
+# Caps for streamed (NDJSON) results; the LLM does not always honour 'LIMIT 5'
+SQL_STREAM_MAX_ROWS = int(os.getenv('SQL_STREAM_MAX_ROWS', '10000'))
+SQL_STREAM_MAX_BYTES = int(os.getenv('SQL_STREAM_MAX_BYTES', str(5 * 1024 * 1024)))
+SQL_STREAM_CHUNK_SIZE = int(os.getenv('SQL_STREAM_CHUNK_SIZE', '500'))
 
-def connect_to_postgres():
-    """Create a connection to the PostgreSQL database."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST_NAME,
-            database=MAINTENANCE_DB,
-            user=DB_USERNAME,
-            password=DB_PASSWORD
-        )
-        logging.info("Successfully connected to the database")
-        return conn
-    except Exception as e:
-        logging.error(f"Error connecting to the database: {e}")
-        return None
+async def generate_sql_query(user_query: str) -> str:
 
-def generate_sql_query(user_query: str) -> str:
+    """
+    Generate an SQL query using OpenAI's GPT-4o model based on user query. Responses reused
+    from the SQL cache carry "cached": True, so callers can tell no LLM call was made.
+    """
+
+    # Repeat and near-identical questions reuse the earlier {"sql", "chart_type"} response
+    cached = sql_cache.lookup_exact(user_query)
+    if cached is not None:
+        logging.info(f"Using cached SQL query: {cached}")
+        return {**cached, "cached": True}
+
+    query_vector = await asyncio.to_thread(encode_query, user_query)
+    cached = sql_cache.lookup_similar(user_query, query_vector)
+    if cached is not None:
+        logging.info(f"Using cached SQL query: {cached}")
+        return {**cached, "cached": True}
 
-    """Generate an SQL query using OpenAI's GPT-3.5-turbo model based on user query."""
     prompt = f"""
     You are an AI assistant skilled in converting natural language queries to SQL and suggesting relevant chart types for visualizations when requested. 
     The database has a table named 'applied_companies' with the following structure:
@@ -102,7 +104,7 @@ def generate_sql_query(user_query: str) -> str:
     """
 
     try:
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that generates SQL queries in JSON format"},
@@ -118,6 +120,8 @@ def generate_sql_query(user_query: str) -> str:
          # Parse the response as JSON
         try:
             json_output = json.loads(sql_query)
+            if isinstance(json_output, dict) and 'sql' in json_output:
+                sql_cache.store(user_query, query_vector, json_output)
             return json_output
         except json.JSONDecodeError:
             logging.error("Failed to parse GPT response as JSON. Here is the raw output:\n%s", sql_query)
@@ -132,29 +136,119 @@ def generate_sql_query(user_query: str) -> str:
         logging.error(f"An error occurred: {e}")
         return None
 
+def execute_sql_query_json(conn, sql_query):
+    """
+    Execute the SQL query and serialize the rows straight to JSON records, choosing each
+    column's encoder once from the cursor description.
+
+    Returns:
+        tuple: (column names, JSON bytes), or (None, None) if the query fails
+    """
+    try:
+        guarded_sql = guard_query(conn, sql_query)
+        with conn.cursor() as cursor:
+            cursor.execute(guarded_sql)
+            column_names = [desc[0] for desc in cursor.description]
+            content = rows_to_json(column_names, cursor.fetchall(), column_encoders(cursor.description))
+
+            logging.info(f"Query executed successfully. Rows: {cursor.rowcount}")
+            return column_names, content
+    except (Exception, Error) as e:
+        logging.error(f"Error executing SQL query: {e}")
+        return None, None
+    finally:
+        # End the guarded read-only transaction
+        conn.rollback()
+
 def execute_sql_query(conn, sql_query):
-    """Execute the SQL query and return the results along with column names."""
+    """Execute the SQL query through the SQL guard and return the results along with column names."""
     try:
+        guarded_sql = guard_query(conn, sql_query)
         with conn.cursor() as cursor:
-            cursor.execute(sql_query)
+            cursor.execute(guarded_sql)
             result = cursor.fetchall()
 
             # Fetch column names from cursor description
             column_names = [desc[0] for desc in cursor.description]
 
-            logging.info(f"Query executed successfully. Result: {result}")
+            logging.info(f"Query executed successfully. Rows: {len(result)}")
             logging.info(f"Column names: {column_names}")
 
             return column_names, result  # Return both column names and result
     except (Exception, Error) as e:
         logging.error(f"Error executing SQL query: {e}")
         return None, None  # Return None for both if an error occurs
+    finally:
+        # End the guarded read-only transaction
+        conn.rollback()
+
+def _ndjson_line(obj) -> bytes:
+    return dumps(obj) + b'\n'
+
+def stream_sql_query(
+    conn,
+    sql_query: str,
+    max_rows: int = SQL_STREAM_MAX_ROWS,
+    max_bytes: int = SQL_STREAM_MAX_BYTES,
+    chunk_size: int = SQL_STREAM_CHUNK_SIZE
+):
+    """
+    Execute the SQL query on a named (server-side) cursor and yield the result as NDJSON lines,
+    fetching chunk_size rows at a time so the full result is never held in memory.
+
+    Lines are: {"columns": [...]}, then one JSON array per row, then a trailer
+    {"done": true, "rows": n, "truncated": bool, "reason": ...}, or {"error": ...} if the query fails.
+    Stops early once max_rows rows or max_bytes bytes have been emitted. Blocking; the caller
+    owns the connection, and the transaction is rolled back when the generator finishes or is closed.
+    """
+    emitted_rows = 0
+    emitted_bytes = 0
+    reason = None
+    try:
+        # The injected LIMIT sits just above max_rows so truncation is still reported
+        guarded_sql = guard_query(conn, sql_query, default_limit=max_rows + 1)
+        with conn.cursor(name=f"sql_stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(guarded_sql)
+
+            # A named cursor only has a description after the first fetch
+            rows = cursor.fetchmany(min(chunk_size, max_rows + 1))
+            encoders = column_encoders(cursor.description)
+            line = _ndjson_line({"columns": [desc[0] for desc in cursor.description]})
+            emitted_bytes += len(line)
+            yield line
+
+            while rows and reason is None:
+                for row in rows:
+                    if emitted_rows >= max_rows:
+                        reason = "max_rows"
+                        break
+                    line = _ndjson_line(encode_row(row, encoders))
+                    if emitted_bytes + len(line) > max_bytes:
+                        reason = "max_bytes"
+                        break
+                    emitted_rows += 1
+                    emitted_bytes += len(line)
+                    yield line
+                else:
+                    rows = cursor.fetchmany(chunk_size)
+
+        logging.info(f"Streamed {emitted_rows} rows ({emitted_bytes} bytes), truncated: {reason}")
+        yield _ndjson_line({"done": True, "rows": emitted_rows, "truncated": reason is not None, "reason": reason})
+
+    except (Exception, Error) as e:
+        logging.error(f"Error streaming SQL query: {e}")
+        yield _ndjson_line({"error": str(e)})
+    finally:
+        # Closes the server-side portal and ends the guarded read-only transaction
+        conn.rollback()
 
 def visualize_sql_result(
     result: List[Tuple], 
     headers: List[str], 
-    chart_type: str
-) -> Optional[pd.DataFrame]:
+    chart_type: str,
+    ax=None
+) -> Optional["pd.DataFrame"]:
     """
     Convert SQL query result into a visual format (table or chart).
     
@@ -162,10 +256,15 @@ def visualize_sql_result(
         result: List of tuples containing SQL query result
         headers: List of strings for the table headers
         chart_type: String indicating the type of chart (Bar, Pie, Line, or Null)
+        ax: Matplotlib Axes to draw on; a new Figure is created when omitted
     
     Returns:
         Optional[pd.DataFrame]: DataFrame if no visualization is created, None otherwise
     """
+    # Plotting libraries are only imported when a chart is drawn in this process
+    import pandas as pd
+    from matplotlib.figure import Figure
+
     # Create a pandas DataFrame from the result
     df = pd.DataFrame(result, columns=headers)
     
@@ -177,52 +276,16 @@ def visualize_sql_result(
     if chart_type == 'Null':
         return df
     
-    # Set up the figure
-    plt.figure(figsize=(10, 6))
-    
-    try:
-        if chart_type == 'Bar':
-            if len(df.columns) < 2:
-                raise ValueError("Bar chart requires at least two columns")
-            
-            sns.barplot(x=df.iloc[:, 0], y=df.iloc[:, 1], palette='viridis')
-            plt.title("Bar Chart Visualization")
-            plt.xticks(rotation=45, ha='right')
-            
-        elif chart_type == 'Pie':
-            if len(df.columns) < 2:
-                raise ValueError("Pie chart requires at least two columns")
-                
-            plt.pie(df.iloc[:, 1], labels=df.iloc[:, 0], 
-                   autopct='%1.1f%%', startangle=140,
-                   colors=sns.color_palette('viridis'))
-            plt.title("Pie Chart Visualization")
-            plt.axis('equal')
-            
-        elif chart_type == 'Line':
-            if len(df.columns) < 2:
-                raise ValueError("Line chart requires at least two columns")
-                
-            sns.lineplot(x=df.iloc[:, 0], y=df.iloc[:, 1],
-                        marker='o', linestyle='-', color='b')
-            plt.title("Line Chart Visualization")
-            plt.xticks(rotation=45, ha='right')
-            
-        else:
-            logging.error(f"Unknown chart type: {chart_type}")
-            return df
-        
-        plt.tight_layout()
-        return None
-        
-    except Exception as e:
-        logging.error(f"Error creating {chart_type} chart: {e}")
-        return df
+    # Draw on a private Figure rather than pyplot's global state
+    if ax is None:
+        ax = Figure(figsize=(10, 6)).subplots()
+
+    return None if draw_chart(ax, df, chart_type) else df
 
 
 def main():
     """Main function to execute the text-to-SQL query process."""
-    conn = connect_to_postgres()
+    conn = acquire_connection()
     
     if conn is None:
         logging.error("Could not connect to the database.")
@@ -233,7 +296,7 @@ def main():
         user_query = input("Enter your question about the database: ")
         
         # Generate SQL query and chart type
-        json_response = generate_sql_query(user_query)
+        json_response = asyncio.run(generate_sql_query(user_query))
         
         if json_response and 'sql' in json_response:
             sql_query = json_response['sql']
@@ -257,9 +320,7 @@ def main():
     except Exception as e:
         logging.error(f"Error in main function: {e}")
     finally:
-        if conn:
-            conn.close()
-            logging.info("Database connection closed.")
+        release_connection(conn)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,287 @@
+import os
+import json
+import math
+import time
+import threading
+import logging
+from psycopg2 import sql, Error
+from psycopg2.extras import Json
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables from .env file
+load_dotenv()
+
+EMBEDDINGS_TABLE = 'applied_companies_embeddings'
+EMBEDDINGS_COLUMN = 'company_embeddings'
+VECTOR_INDEX_NAME = 'applied_companies_embeddings_vector_idx'
+EMBEDDING_DIMENSIONS = 384  # thenlper/gte-small
+
+# Queries and the index must agree on the metric: <=> is cosine distance, served by vector_cosine_ops
+DISTANCE_OPERATOR = '<=>'
+OPERATOR_CLASS = 'vector_cosine_ops'
+
+# 'hnsw' (default) or 'ivfflat'
+VECTOR_INDEX_TYPE = os.getenv('VECTOR_INDEX_TYPE', 'hnsw')
+
+# HNSW build and search parameters, chosen with main() (results in the README): pgvector's
+# default m and ef_construction, with ef_search raised from 40 to 100, which keeps recall@10
+# near 0.97 at 100k rows for about 1.5 ms more per query. m=32 gains ~3 points at 3x the build.
+VECTOR_HNSW_M = int(os.getenv('VECTOR_HNSW_M', '16'))
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv('VECTOR_HNSW_EF_CONSTRUCTION', '64'))
+VECTOR_HNSW_EF_SEARCH = int(os.getenv('VECTOR_HNSW_EF_SEARCH', '100'))
+
+# IVFFlat: lists default to rows / 1000 (sqrt(rows) past a million rows), probes to sqrt(lists).
+# Its centroids are fixed at build time, so it is rebuilt once the table has grown by
+# VECTOR_INDEX_REBUILD_GROWTH, and is not built at all below VECTOR_IVFFLAT_MIN_ROWS.
+VECTOR_IVFFLAT_LISTS = int(os.getenv('VECTOR_IVFFLAT_LISTS', '0'))  # 0 = derive from row count
+VECTOR_IVFFLAT_PROBES = int(os.getenv('VECTOR_IVFFLAT_PROBES', '0'))  # 0 = derive from lists
+VECTOR_IVFFLAT_MIN_ROWS = int(os.getenv('VECTOR_IVFFLAT_MIN_ROWS', '1000'))
+VECTOR_INDEX_REBUILD_GROWTH = float(os.getenv('VECTOR_INDEX_REBUILD_GROWTH', '2.0'))
+
+# How long query-time settings derived from the index state are reused
+SEARCH_SETTINGS_TTL_SECONDS = 300
+
+_search_settings = {"loaded_at": None, "ef_search": VECTOR_HNSW_EF_SEARCH, "probes": VECTOR_IVFFLAT_PROBES or 1}
+_search_settings_lock = threading.Lock()
+
+
+def ivfflat_lists(row_count: int) -> int:
+    """Number of IVFFlat lists for a table of row_count rows."""
+    if VECTOR_IVFFLAT_LISTS:
+        return VECTOR_IVFFLAT_LISTS
+    if row_count > 1_000_000:
+        return int(math.sqrt(row_count))
+    return max(10, row_count // 1000)
+
+
+def ivfflat_probes(lists: int) -> int:
+    """Lists searched per IVFFlat query."""
+    return VECTOR_IVFFLAT_PROBES or max(1, round(math.sqrt(lists)))
+
+
+def desired_index(row_count: int):
+    """The (index type, build parameters) the current configuration asks for."""
+    if VECTOR_INDEX_TYPE == 'hnsw':
+        return 'hnsw', {"m": VECTOR_HNSW_M, "ef_construction": VECTOR_HNSW_EF_CONSTRUCTION}
+    if VECTOR_INDEX_TYPE == 'ivfflat':
+        return 'ivfflat', {"lists": ivfflat_lists(row_count)}
+    raise ValueError(f"Unknown vector index type: {VECTOR_INDEX_TYPE}")
+
+
+def _index_statement(name, index_type, params, table=EMBEDDINGS_TABLE, column=EMBEDDINGS_COLUMN, concurrently=True):
+    options = sql.SQL(', ').join(
+        sql.SQL("{} = {}").format(sql.Identifier(key), sql.Literal(value)) for key, value in params.items()
+    )
+    return sql.SQL("CREATE INDEX {}{} ON {} USING {} ({} {}) WITH ({})").format(
+        sql.SQL("CONCURRENTLY " if concurrently else ""), sql.Identifier(name), sql.Identifier(table), sql.SQL(index_type),
+        sql.Identifier(column), sql.SQL(OPERATOR_CLASS), options
+    )
+
+
+def _read_state(cursor):
+    cursor.execute(
+        "SELECT index_type, params, row_count FROM vector_index_state WHERE index_name = %s;",
+        (VECTOR_INDEX_NAME,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    params = row[1] if isinstance(row[1], dict) else json.loads(row[1])
+    return {"index_type": row[0], "params": params, "row_count": row[2]}
+
+
+def needs_rebuild(state, row_count):
+    """Return the reason the index must be (re)built, or None if it is current."""
+    index_type, params = desired_index(row_count)
+    if state is None:
+        return "no index recorded"
+    if state["index_type"] != index_type:
+        return f"index type changed to {index_type}"
+    if index_type == 'hnsw' and state["params"] != params:
+        return f"HNSW parameters changed to {params}"
+    if index_type == 'ivfflat':
+        if VECTOR_IVFFLAT_LISTS and state["params"].get("lists") != VECTOR_IVFFLAT_LISTS:
+            return f"lists changed to {VECTOR_IVFFLAT_LISTS}"
+        if row_count >= max(state["row_count"], 1) * VECTOR_INDEX_REBUILD_GROWTH:
+            return f"table grew from {state['row_count']} to {row_count} rows"
+    return None
+
+
+def rebuild_index(conn, index_type, params, row_count):
+    """
+    Build the index under a temporary name without blocking writers, then swap it in for the
+    old one and record what was built. Restores the connection's autocommit setting afterwards.
+    """
+    temp_name = f"{VECTOR_INDEX_NAME}_new"
+    autocommit = conn.autocommit
+    conn.autocommit = True  # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    try:
+        with conn.cursor() as cursor:
+            started = time.perf_counter()
+            cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(temp_name)))
+            cursor.execute(_index_statement(temp_name, index_type, params))
+            cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(VECTOR_INDEX_NAME)))
+            cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(sql.Identifier(temp_name), sql.Identifier(VECTOR_INDEX_NAME)))
+            cursor.execute("""
+                INSERT INTO vector_index_state (index_name, index_type, params, row_count, built_at)
+                VALUES (%s, %s, %s, %s, now())
+                ON CONFLICT (index_name) DO UPDATE
+                SET index_type = EXCLUDED.index_type, params = EXCLUDED.params,
+                    row_count = EXCLUDED.row_count, built_at = EXCLUDED.built_at;
+            """, (VECTOR_INDEX_NAME, index_type, Json(params), row_count))
+            logging.info(f"Built {index_type} index {VECTOR_INDEX_NAME} {params} on {row_count} rows "
+                         f"in {time.perf_counter() - started:.1f}s.")
+    finally:
+        conn.autocommit = autocommit
+
+
+def ensure_vector_index(conn):
+    """
+    Make sure the embeddings index matches the configuration and the table size, rebuilding it
+    when the type or parameters changed or an IVFFlat index has gone stale. Call after writes.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(EMBEDDINGS_TABLE)))
+            row_count = cursor.fetchone()[0]
+            state = _read_state(cursor)
+        conn.rollback()
+
+        index_type, params = desired_index(row_count)
+        if index_type == 'ivfflat' and row_count < VECTOR_IVFFLAT_MIN_ROWS:
+            logging.info(f"Skipping IVFFlat index until {VECTOR_IVFFLAT_MIN_ROWS} rows (have {row_count}).")
+            return
+
+        reason = needs_rebuild(state, row_count)
+        if reason is None:
+            logging.info(f"Vector index {VECTOR_INDEX_NAME} is current ({row_count} rows).")
+            return
+        logging.info(f"Rebuilding vector index: {reason}.")
+        rebuild_index(conn, index_type, params, row_count)
+    except (Exception, Error) as e:
+        conn.rollback()
+        logging.error(f"Error maintaining the vector index: {e}")
+
+
+def _load_search_settings(cursor):
+    """Refresh ef_search/probes from the recorded index at most every SEARCH_SETTINGS_TTL_SECONDS."""
+    now = time.monotonic()
+    with _search_settings_lock:
+        loaded_at = _search_settings["loaded_at"]
+        if loaded_at is not None and now - loaded_at < SEARCH_SETTINGS_TTL_SECONDS:
+            return dict(_search_settings)
+        _search_settings["loaded_at"] = now
+
+    try:
+        state = _read_state(cursor)
+    except Error as e:
+        logging.warning(f"Could not read vector index state: {e}")
+        cursor.connection.rollback()
+        state = None
+
+    with _search_settings_lock:
+        if state is not None and state["index_type"] == 'ivfflat':
+            _search_settings["probes"] = ivfflat_probes(state["params"].get("lists", 1))
+        return dict(_search_settings)
+
+
+def apply_search_settings(cursor):
+    """Set hnsw.ef_search and ivfflat.probes for the current transaction only."""
+    settings = _load_search_settings(cursor)
+    cursor.execute(
+        "SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true);",
+        (str(settings["ef_search"]), str(settings["probes"]))
+    )
+
+
+def _synthetic_vectors(count, clusters=50, seed=0):
+    """Clustered random unit vectors, closer to real embeddings than uniform noise."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, EMBEDDING_DIMENSIONS))
+    vectors = centers[rng.integers(0, clusters, count)] + 0.5 * rng.normal(size=(count, EMBEDDING_DIMENSIONS))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _literal(vector):
+    return '[' + ','.join(map(repr, vector.tolist())) + ']'
+
+
+def main():
+    """
+    Recall-vs-latency benchmark on synthetic data in a TEMP table (nothing persists): for each
+    index configuration, recall@10 against exact search and mean query latency.
+    Usage: python -m LLM_agents.vector_index [rows] [queries]
+    """
+    import sys
+    import numpy as np
+    from psycopg2.extras import execute_values
+    from LLM_agents.db_pool import acquire_connection, release_connection
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    query_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    k = 10
+
+    conn = acquire_connection()
+    if conn is None:
+        logging.error("Could not connect to the database.")
+        return
+
+    try:
+        conn.autocommit = True
+        # Queries are held-out draws from the same clusters as the data, like real questions
+        # about companies that are in the table
+        vectors = _synthetic_vectors(rows + query_count)
+        data, queries = vectors[:rows], vectors[rows:]
+
+        with conn.cursor() as cursor:
+            cursor.execute(f"CREATE TEMP TABLE bench_vectors (id INT PRIMARY KEY, v VECTOR({EMBEDDING_DIMENSIONS}))")
+            execute_values(cursor, "INSERT INTO bench_vectors (id, v) VALUES %s",
+                           [(i, _literal(vector)) for i, vector in enumerate(data)], template="(%s, %s::vector)")
+            cursor.execute("ANALYZE bench_vectors")
+
+            # Exact neighbours, computed locally (cosine on unit vectors is a dot product)
+            truth = [set(np.argsort(-(data @ query))[:k]) for query in queries]
+
+            def measure(label, setting=None, value=None):
+                if setting:
+                    cursor.execute("SELECT set_config(%s, %s, false)", (setting, str(value)))
+                hits, started = 0, time.perf_counter()
+                for query, expected in zip(queries, truth):
+                    cursor.execute(f"SELECT id FROM bench_vectors ORDER BY v {DISTANCE_OPERATOR} %s::vector LIMIT {k}",
+                                   (_literal(query),))
+                    hits += len(expected & {row[0] for row in cursor.fetchall()})
+                latency_ms = (time.perf_counter() - started) / len(queries) * 1000
+                print(f"{label:<45} recall@{k} {hits / (k * len(queries)):.3f}  latency {latency_ms:.2f} ms")
+
+            measure("exact (sequential scan)")
+
+            for m, ef_construction in ((8, 32), (16, 64), (32, 128)):
+                started = time.perf_counter()
+                cursor.execute(_index_statement("bench_idx", "hnsw", {"m": m, "ef_construction": ef_construction},
+                                                table="bench_vectors", column="v", concurrently=False))
+                build_s = time.perf_counter() - started
+                for ef_search in (10, 40, 100, 200):
+                    measure(f"hnsw m={m} ef_c={ef_construction} (build {build_s:.1f}s) ef_search={ef_search}",
+                            "hnsw.ef_search", ef_search)
+                cursor.execute("DROP INDEX bench_idx")
+
+            lists = ivfflat_lists(rows)
+            started = time.perf_counter()
+            cursor.execute(_index_statement("bench_idx", "ivfflat", {"lists": lists}, table="bench_vectors", column="v",
+                                            concurrently=False))
+            build_s = time.perf_counter() - started
+            for probes in sorted({1, ivfflat_probes(lists), lists // 4 or 1, lists // 2 or 1}):
+                measure(f"ivfflat lists={lists} (build {build_s:.1f}s) probes={probes}", "ivfflat.probes", probes)
+            cursor.execute("DROP INDEX bench_idx")
+    finally:
+        conn.autocommit = False
+        release_connection(conn)
+
+
+if __name__ == "__main__":
+    main()
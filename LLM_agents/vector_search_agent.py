@@ -1,12 +1,16 @@
 import os
-import psycopg2
+import re
+import threading
 from psycopg2 import sql, Error
-from sentence_transformers import SentenceTransformer
-import openai
 from dotenv import load_dotenv
+from LLM_agents.db_pool import acquire_connection, release_connection
+from LLM_agents.embeddings import encode_queries
+from LLM_agents.vector_index import apply_search_settings
+from LLM_agents.embedding_replica import embedding_replica
+from LLM_agents.company_mentions import exact_names, candidate_fragments
 import logging
 from typing import AsyncGenerator
-from openai import AsyncOpenAI
+from LLM_agents.llm_gateway import stream_chat_completion
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -14,95 +18,331 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Load environment variables from .env file
 load_dotenv()
 
-# PostgreSQL connection parameters
-DB_HOST_NAME = os.getenv('DB_HOST_NAME')
-MAINTENANCE_DB = os.getenv('MAINTENANCE_DB')
-DB_USERNAME = os.getenv('DB_USERNAME')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-
 # OpenAI API key
 openai_api_key = os.getenv('OPENAI_API_KEY')
 
 if not openai_api_key:
     raise ValueError("OpenAI API key not found. Make sure it is set in the .env file.")
 
-# Load the embedding model from Hugging Face
-model = SentenceTransformer('thenlper/gte-small')
 
-# Initialize OpenAI API
-client = openai.OpenAI(
-    api_key=openai_api_key,
-)
+# Company-name lookup tried before the embedding model. Names whose trigram similarity to a
+# run of up to COMPANY_NAME_MAX_WORDS query words is at least COMPANY_LEXICAL_THRESHOLD are
+# candidates, ranked by word_similarity() against the whole query; a top score of
+# COMPANY_EXACT_MATCH_SCORE (the whole name appears in the query) answers without encoding
+# the query at all.
+COMPANY_LEXICAL_THRESHOLD = float(os.getenv('COMPANY_LEXICAL_THRESHOLD', '0.6'))
+COMPANY_EXACT_MATCH_SCORE = float(os.getenv('COMPANY_EXACT_MATCH_SCORE', '1.0'))
+COMPANY_NAME_MAX_WORDS = int(os.getenv('COMPANY_NAME_MAX_WORDS', '4'))
 
+# Candidates taken from each retriever, and the k of reciprocal rank fusion (score = sum 1 / (k + rank))
+COMPANY_CANDIDATES = int(os.getenv('COMPANY_CANDIDATES', '5'))
+COMPANY_RRF_K = int(os.getenv('COMPANY_RRF_K', '60'))
 
-def connect_to_postgres():
-    """Create a connection to the PostgreSQL database."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST_NAME,
-            database=MAINTENANCE_DB,
-            user=DB_USERNAME,
-            password=DB_PASSWORD
+# Questions listing several companies are answered in one LLM call. Company names found in
+# the whole question are mentions; other parts of a list ("Stripe, Plaid and Brex") of at most
+# MULTI_COMPANY_MAX_WORDS words become mentions only if they match a known company name.
+# At most MULTI_COMPANY_MAX_MENTIONS companies are looked up per question.
+MULTI_COMPANY_MAX_MENTIONS = int(os.getenv('MULTI_COMPANY_MAX_MENTIONS', '5'))
+MULTI_COMPANY_MAX_WORDS = int(os.getenv('MULTI_COMPANY_MAX_WORDS', '4'))
+
+_lookup_stats = {"exact": 0, "fused": 0, "vector_only": 0, "not_found": 0, "in_memory": 0, "multi_company": 0}
+_lookup_stats_lock = threading.Lock()
+
+
+def _record_lookup(outcome):
+    with _lookup_stats_lock:
+        _lookup_stats[outcome] += 1
+
+
+def get_lookup_stats():
+    """
+    How company mentions were answered (exact name hit, fused lexical + vector, vector alone
+    or in memory), and how many questions listed several companies.
+    """
+    with _lookup_stats_lock:
+        return dict(_lookup_stats)
+
+
+def to_vector_literal(vector) -> str:
+    """Format an embedding as a pgvector text literal, e.g. '[0.1,0.2]'."""
+    return '[' + ','.join(map(repr, vector.tolist())) + ']'
+
+
+def _group_by_mention(rows, count):
+    """Split rows tagged with their 1-based mention number into one list per mention."""
+    grouped = [[] for _ in range(count)]
+    for row in rows:
+        grouped[row[0] - 1].append(tuple(row[1:]))
+    return grouped
+
+
+def name_ngrams(query, max_words=COMPANY_NAME_MAX_WORDS):
+    """Every run of 1 to max_words consecutive words in the query, the texts a company name is compared with."""
+    words = re.findall(r'\w+', query.lower())
+    ngrams = {' '.join(words[start:start + size])
+              for size in range(1, max_words + 1) for start in range(len(words) - size + 1)}
+    return sorted(ngram for ngram in ngrams if len(ngram) >= 2)
+
+
+def lexical_company_search(cursor, queries, limit=COMPANY_CANDIDATES):
+    """
+    For each query, the rows whose company name matches words in it, best first, all in one
+    round trip. Candidates come from `lower(company_name) % ngram` for every word n-gram of the
+    query, the form the trigram index on lower(company_name) serves, so this needs no
+    embedding and no scan of applied_companies. Each row ends with its word_similarity score.
+    """
+    ords, ngrams = [], []
+    for position, query in enumerate(queries, start=1):
+        for ngram in name_ngrams(query):
+            ords.append(position)
+            ngrams.append(ngram)
+
+    cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", (str(COMPANY_LEXICAL_THRESHOLD),))
+    cursor.execute("""
+        WITH hits AS (
+            SELECT DISTINCT g.ord, hit.id
+            FROM unnest(%(ords)s::int[], %(ngrams)s::text[]) AS g(ord, ngram)
+            CROSS JOIN LATERAL (
+                SELECT id FROM applied_companies WHERE lower(company_name) %% g.ngram
+            ) hit
         )
-        logging.info("Successfully connected to the database")
-        return conn
-    except Exception as e:
-        logging.error(f"Error connecting to the database: {e}")
-        return None
+        SELECT q.ord, c.*
+        FROM unnest(%(queries)s::text[]) WITH ORDINALITY AS q(query, ord)
+        CROSS JOIN LATERAL (
+            SELECT ac.id, ac.company_name, ac.company_website, ac.job_position, ac.applied_date, ac.application_status,
+                   word_similarity(lower(ac.company_name), lower(q.query)) AS score
+            FROM hits
+            JOIN applied_companies ac ON ac.id = hits.id
+            WHERE hits.ord = q.ord
+            ORDER BY score DESC, length(ac.company_name) DESC, ac.applied_date DESC
+            LIMIT %(limit)s
+        ) c
+        ORDER BY q.ord, c.score DESC, length(c.company_name) DESC, c.applied_date DESC;
+    """, {"ords": ords, "ngrams": ngrams, "queries": list(queries), "limit": limit})
+    return _group_by_mention(cursor.fetchall(), len(queries))
+
+
+def vector_company_search(cursor, queries, limit=COMPANY_CANDIDATES):
+    """
+    For each query, the nearest rows to its embedding, closest first. All queries are encoded
+    in one batch and searched in one round trip. Each row ends with its cosine distance.
+    """
+    # Repeated questions come from the LRU
+    query_vectors = encode_queries(queries)
+
+    # Each vector is bound once and the LATERAL subquery orders by its select-list alias, which
+    # still lets pgvector use its index per vector. <=> (cosine distance) matches the index's
+    # vector_cosine_ops operator class.
+    apply_search_settings(cursor)
+    search_query = sql.SQL("""
+        SELECT q.ord, c.*
+        FROM unnest(%s::vector[]) WITH ORDINALITY AS q(embedding, ord)
+        CROSS JOIN LATERAL (
+            SELECT ac.id, ac.company_name, ac.company_website, ac.job_position, ac.applied_date, ac.application_status,
+                   ace.company_embeddings <=> q.embedding AS distance
+            FROM applied_companies ac
+            JOIN applied_companies_embeddings ace ON ac.id = ace.applied_company_id
+            ORDER BY distance
+            LIMIT %s
+        ) c
+        ORDER BY q.ord, c.distance;
+    """)
+    cursor.execute(search_query, ([to_vector_literal(vector) for vector in query_vectors], limit))
+    return _group_by_mention(cursor.fetchall(), len(queries))
+
+
+def reciprocal_rank_fusion(*ranked_lists, k=COMPANY_RRF_K):
+    """Merge ranked row lists by reciprocal rank fusion, keyed on the row id. Returns rows best first."""
+    scores, rows = {}, {}
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked, start=1):
+            scores[row[0]] = scores.get(row[0], 0.0) + 1.0 / (k + rank)
+            rows.setdefault(row[0], row)
+    return [rows[row_id] for row_id in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _unique_matches(matches):
+    """Drop missing and repeated rows, e.g. two mentions that resolved to the same application."""
+    unique = {}
+    for row in matches:
+        if row is not None:
+            unique.setdefault(row[0], row)
+    return list(unique.values())
+
+
+def _resolve(cursor, queries, lexical):
+    """
+    Best matching application for each query given its lexical candidates, in order (None
+    where nothing matched). Exact name hits are final; only the remaining queries are encoded
+    and searched by vector in one round trip, and each one's candidate lists are merged by
+    rank fusion.
+    """
+    pending = [i for i, rows in enumerate(lexical) if not rows or rows[0][-1] < COMPANY_EXACT_MATCH_SCORE]
+    vector = {}
+    if pending:
+        logging.info(f"Encoding the user query: {[queries[i] for i in pending]}")
+        vector = dict(zip(pending, vector_company_search(cursor, [queries[i] for i in pending])))
+
+    matches = []
+    for i, rows in enumerate(lexical):
+        if i not in vector:
+            logging.info(f"Exact company name match found: {rows[0]}")
+            _record_lookup("exact")
+            matches.append(rows[0])
+            continue
+        results = reciprocal_rank_fusion(rows, vector[i])
+        if results:
+            _record_lookup("fused" if rows else "vector_only")
+            logging.info(f"Most similar company found: {results[0]}")
+            matches.append(results[0])
+        else:
+            _record_lookup("not_found")
+            logging.warning(f"No similar company found for '{queries[i]}'.")
+            matches.append(None)
+    return matches
+
+
+def company_search(conn, queries):
+    """
+    Best matching application for each query, in order (None where nothing matched). The
+    company-name index is tried first; two round trips at most, however many queries there are.
+    """
+    with conn.cursor() as cursor:
+        return _resolve(cursor, queries, lexical_company_search(cursor, queries))
+
+
+def _one_row_per_name(rows):
+    """
+    Rows whose whole company name appears in the query, best first, one per distinct name and
+    without names contained in a longer one found alongside ("Meta" within "Meta Platforms").
+    """
+    best = {}
+    for row in rows:
+        best.setdefault(row[1], row)
+    return [best[name] for name in exact_names(best)][:MULTI_COMPANY_MAX_MENTIONS]
 
 
 def perform_similarity_search(conn, query):
-    """Perform a vector similarity search based on a user query using cosine similarity."""
+    """
+    Find the application that best matches a user query. The company-name index is tried
+    first and an exact name hit is returned straight away; otherwise vector search runs and
+    both candidate lists are merged by rank fusion.
+    """
     try:
-        # Step 1: Encode the user query into a vector
-        logging.info(f"Encoding the user query: {query}")
-        query_vector = model.encode([query])[0]  # Get the embedding for the query
-        
-        # Convert the vector to a proper string format with square brackets for PostgreSQL
-        query_vector_str = '[' + ','.join(map(str, query_vector)) + ']'
+        return company_search(conn, [query])[0]
+    except (Exception, Error) as e:
+        logging.error(f"Error during similarity search: {e}")
+        return None
+
 
-        # Step 2: Perform the vector similarity search in PostgreSQL
+def perform_multi_company_search(conn, query):
+    """
+    Best matching application for each company the query mentions, without repeats. The whole
+    query is looked up first, so a name containing a separator ("Johnson & Johnson") is found
+    intact. Parts of a list-style question outside the names found are kept only if they match
+    a known company name; anything else leaves the whole query as the single mention.
+    """
+    try:
         with conn.cursor() as cursor:
-            search_query = sql.SQL("""
-                SELECT ac.id, ac.company_name, ac.company_website, ac.job_position, ac.applied_date, ac.application_status,
-                       ace.company_embeddings <-> %s::vector AS similarity
-                FROM applied_companies ac
-                JOIN applied_companies_embeddings ace ON ac.id = ace.applied_company_id
-                ORDER BY ace.company_embeddings <-> %s::vector -- Ensure cosine distance is used
-                LIMIT 1;
-            """)
-            cursor.execute(search_query, (query_vector_str, query_vector_str))
-            result = cursor.fetchone()
-            
-            if result:
-                logging.info(f"Most similar company found: {result}")
-                return result
-            else:
-                logging.warning("No similar company found.")
-                return None
+            whole = lexical_company_search(cursor, [query])[0]
+            named = _one_row_per_name([row for row in whole if row[-1] >= COMPANY_EXACT_MATCH_SCORE])
+
+            fragments = candidate_fragments(query, [row[1] for row in named], MULTI_COMPANY_MAX_WORDS)
+            hits = []
+            if fragments:
+                hits = [(fragment, rows) for fragment, rows in zip(fragments, lexical_company_search(cursor, fragments)) if rows]
+            hits = hits[:MULTI_COMPANY_MAX_MENTIONS - len(named)]
+
+            if not named and len(hits) < 2:
+                # Not a list of known companies: the whole question is one mention
+                return _unique_matches(_resolve(cursor, [query], [whole]))
+
+            for row in named:
+                logging.info(f"Exact company name match found: {row}")
+                _record_lookup("exact")
+            matches = named + _resolve(cursor, [fragment for fragment, _ in hits], [rows for _, rows in hits])
+
+        if len(matches) > 1:
+            logging.info(f"Query mentions {len(matches)} companies: {[row[1] for row in matches if row]}")
+            _record_lookup("multi_company")
+        return _unique_matches(matches)
     except (Exception, Error) as e:
         logging.error(f"Error during similarity search: {e}")
-        return None
+        return []
 
 
-async def generate_openai_response(user_query: str, company_details) -> AsyncGenerator[str, None]:
-    """Generate a response using OpenAI's GPT-3.5-turbo model based on user query and company details."""
-    company_name = company_details[1]
-    company_website = company_details[2]
-    job_position = company_details[3]
-    applied_date = company_details[4]
-    application_status = company_details[5]
-    
-    prompt = f"""
-            You are a helpful assistant. The user asked the following query: '{user_query}'.
+def replica_similarity_search(query):
+    """
+    perform_multi_company_search answered from the in-process embedding replica, without a
+    database round trip. Every company name found in the query is a mention; the replica has
+    no fuzzy name index, so other parts of a list are not looked up. With no name found, the
+    nearest embedding to the whole query answers.
+    """
+    named = _one_row_per_name(embedding_replica.match_names(query))
+    if named:
+        for row in named:
+            logging.info(f"Exact company name match found in memory: {row}")
+            _record_lookup("exact")
+        if len(named) > 1:
+            _record_lookup("multi_company")
+        return named
+
+    results = embedding_replica.search(encode_queries([query])[0], limit=1)
+    if results:
+        _record_lookup("in_memory")
+        logging.info(f"Most similar company found in memory: {results[0]}")
+        return results
+    _record_lookup("not_found")
+    logging.warning("No similar company found.")
+    return []
+
+
+def pooled_similarity_search(query):
+    """
+    Matching applications for every company the query mentions. Answer from the embedding
+    replica when it is loaded; otherwise borrow a pooled (read replica when available)
+    connection, run perform_multi_company_search and always return the connection.
+    """
+    if embedding_replica.loaded:
+        try:
+            return replica_similarity_search(query)
+        except Exception as e:
+            logging.error(f"Error during in-memory similarity search, falling back to Postgres: {e}")
+    conn = acquire_connection(readonly=True)
+    if conn is None:
+        raise ConnectionError("Unable to connect to the database.")
+    try:
+        return perform_multi_company_search(conn, query)
+    finally:
+        release_connection(conn)
+
 
-            The most relevant match found in the database is as follows:
+def _company_context(company_details):
+    """The lines describing one matched application in the prompt."""
+    company_name, company_website, job_position, applied_date, application_status = company_details[1:6]
+    return f"""
             - Company Name: {company_name}
             - Company Website: {company_website}
             - Job Position: {job_position}
             - Applied Date: {applied_date}
             - Application Status:
-              {application_status}
+              {application_status}"""
+
+
+async def generate_openai_response(user_query: str, company_details) -> AsyncGenerator[str, None]:
+    """
+    Generate a response using OpenAI's GPT-4o model based on user query and company details.
+    company_details is one matched row, or a list of rows when the query names several companies;
+    either way the answer comes from a single call.
+    """
+    matches = [company_details] if isinstance(company_details, tuple) else list(company_details)
+
+    if len(matches) == 1:
+        company_name = matches[0][1]
+        prompt = f"""
+            You are a helpful assistant. The user asked the following query: '{user_query}'.
+
+            The most relevant match found in the database is as follows:{_company_context(matches[0])}
 
             Here are the rules to guide your response:
 
@@ -116,24 +356,38 @@ async def generate_openai_response(user_query: str, company_details) -> AsyncGen
 
             Do not generate or assume any information beyond the provided context. Ensure your response remains strictly within the data provided.
             """
-    
-    client = AsyncOpenAI()
+    else:
+        company_names = ", ".join(f"'{match[1]}'" for match in matches)
+        prompt = f"""
+            You are a helpful assistant. The user asked the following query about several companies: '{user_query}'.
 
+            The most relevant matches found in the database are as follows:{"".join(_company_context(match) for match in matches)}
+
+            Here are the rules to guide your response:
+
+            1. **Answer for each company mentioned in the user's query, in the order it is mentioned,** with one short line per company.
+
+            2. **If a company mentioned in the user's query is one of {company_names},** provide a concise and accurate response about it based **only** on the above context.
+
+            3. **If a company mentioned in the user's query is not one of {company_names},** say that they haven't applied to that company yet.
+            For example: If the user's query contains "Company X" and no company in context is "Company X". Your line would be: "You haven't applied to company X yet."
+
+            Do not mention companies from the context that the user did not ask about. Do not generate or assume any information beyond the provided context. Ensure your response remains strictly within the data provided.
+            """
+    
     try:
-        stream = await client.chat.completions.create(
+        # Streamed over the gateway's shared keep-alive connections
+        async for text in stream_chat_completion(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=100,
-            temperature=0.1,
-            stream=True
-        )
-        
-        async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                yield chunk.choices[0].delta.content
+            # About one short answer per company
+            max_tokens=100 * len(matches),
+            temperature=0.1
+        ):
+            yield text
     except Exception as e:
         logging.error(f"Error during OpenAI request: {e}")
         yield "There was an error processing your request. Please try again later."
@@ -141,7 +395,7 @@ async def generate_openai_response(user_query: str, company_details) -> AsyncGen
 
 def main():
     """Main function to execute the similarity search and get a response from OpenAI."""
-    conn = connect_to_postgres()
+    conn = acquire_connection()
     
     if conn is None:
         logging.error("Could not connect to the database.")
@@ -151,8 +405,8 @@ def main():
         # User input
         user_query = input("Enter your query: ")
         
-        # Step 1: Perform similarity search
-        result = perform_similarity_search(conn, user_query)
+        # Step 1: Perform similarity search for every company the query mentions
+        result = perform_multi_company_search(conn, user_query)
         
         if result:
             # Step 2: Generate OpenAI response
@@ -165,9 +419,7 @@ def main():
     except Exception as e:
         logging.error(f"Error in main function: {e}")
     finally:
-        if conn:
-            conn.close()
-            logging.info("Database connection closed.")
+        release_connection(conn)
 
 
 if __name__ == "__main__":
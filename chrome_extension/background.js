@@ -1,33 +1,161 @@
+const API_BASE_URL = 'http://54.176.180.245:8000';
+
+// Tabs that finish loading within this window (e.g. a restored session) share one request
+const BATCH_WINDOW_MS = 250;
+let pendingUrls = [];
+let batchTimer = null;
+
+// Digest of hashed applied domains; refreshed through the delta feed at most this often
+const DIGEST_REFRESH_MS = 10 * 60 * 1000;
+let digest = null;  // { version, hashChars, hashes: Set, fetchedAt }
+
 chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
   if (changeInfo.status === 'complete' && tab.url) {
     checkCompanyWebsite(tab.url);
   }
 });
 
-function checkCompanyWebsite(url) {
+async function checkCompanyWebsite(url) {
   // Extract domain without the 'www.' prefix
   const domain = new URL(url).hostname.replace(/^www\./, '');
   console.log(`Checking domain: ${domain}`);
 
-  fetch('http://54.176.180.245:8000/check-url', {
+  if (await isDefinitelyNotApplied(url)) {
+    console.log("Domain not in applied digest, skipping API call.");
+    chrome.storage.local.set({ jobInfo: { message: `Not yet applied to ${domain}`, company_website: domain } });
+    return;
+  }
+
+  // Send the full URL so the server can resolve ATS-hosted job boards by their path
+  pendingUrls.push(url);
+  if (!batchTimer) {
+    batchTimer = setTimeout(flushPendingUrls, BATCH_WINDOW_MS);
+  }
+}
+
+function flushPendingUrls() {
+  const urls = pendingUrls;
+  pendingUrls = [];
+  batchTimer = null;
+
+  fetch(`${API_BASE_URL}/check-urls`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
     },
-    body: JSON.stringify({ url: domain })
+    body: JSON.stringify({ urls: urls })
   })
     .then(response => response.json())
     .then(data => {
       console.log("Received API response: ", data);
-      chrome.storage.local.set({ jobInfo: data });
+      const results = data.results || [];
+      if (results.length === 0) {
+        return;
+      }
 
-      // Automatically open popup if the response contains "Applied for"
-      if (data.message && data.message.includes('Applied for')) {
+      // Automatically open popup if any response contains "Applied for"
+      const match = results.find(result => result.message && result.message.includes('Applied for'));
+      if (match) {
         console.log("Match found, opening popup.");
+        chrome.storage.local.set({ jobInfo: match });
         chrome.action.openPopup();
       } else {
         console.log("No match found.");
+        chrome.storage.local.set({ jobInfo: results[results.length - 1] });
       }
     })
     .catch(error => console.error('Error in API call:', error));
 }
+
+// Every key the server's registrable_domain() could produce for this URL: each hostname
+// suffix, plus the ATS forms '<suffix>/<first path segment>' and '<suffix>/<first label>'
+function candidateDomainKeys(url) {
+  const parsed = new URL(url.toLowerCase());
+  const labels = parsed.hostname.replace(/\.$/, '').split('.');
+  const firstSegment = parsed.pathname.split('/').filter(Boolean)[0];
+  const keys = [];
+
+  for (let i = 0; i < labels.length; i++) {
+    const suffix = labels.slice(i).join('.');
+    keys.push(suffix);
+    if (firstSegment) {
+      keys.push(`${suffix}/${firstSegment}`);
+    }
+    if (i > 0) {
+      keys.push(`${suffix}/${labels[0]}`);
+    }
+  }
+  return keys;
+}
+
+async function hashKey(key, hashChars) {
+  const bytes = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(key));
+  const hex = Array.from(new Uint8Array(bytes), b => b.toString(16).padStart(2, '0')).join('');
+  return hex.slice(0, hashChars);
+}
+
+// True only when the digest proves no applied domain matches; any doubt falls back to the API
+async function isDefinitelyNotApplied(url) {
+  try {
+    const current = await getDigest();
+    if (!current || !url.startsWith('http')) {
+      return false;
+    }
+    for (const key of candidateDomainKeys(url)) {
+      if (current.hashes.has(await hashKey(key, current.hashChars))) {
+        return false;
+      }
+    }
+    return true;
+  } catch (error) {
+    console.error('Error checking domain digest:', error);
+    return false;
+  }
+}
+
+async function getDigest() {
+  if (!digest) {
+    const stored = await chrome.storage.local.get('domainDigest');
+    if (stored.domainDigest) {
+      digest = { ...stored.domainDigest, hashes: new Set(stored.domainDigest.hashes) };
+    }
+  }
+  if (!digest) {
+    await fetchFullDigest();
+  } else if (Date.now() - digest.fetchedAt > DIGEST_REFRESH_MS) {
+    await fetchDigestDelta();
+  }
+  return digest;
+}
+
+async function fetchFullDigest() {
+  const response = await fetch(`${API_BASE_URL}/applied-domains/digest`);
+  if (!response.ok) {
+    return;
+  }
+  const data = await response.json();
+  digest = { version: data.version, hashChars: data.hash_chars, hashes: new Set(data.hashes), fetchedAt: Date.now() };
+  saveDigest();
+}
+
+async function fetchDigestDelta() {
+  const response = await fetch(`${API_BASE_URL}/applied-domains/delta?since=${encodeURIComponent(digest.version)}`);
+  if (!response.ok) {
+    return;
+  }
+  const data = await response.json();
+  if (data.reset) {
+    await fetchFullDigest();
+    return;
+  }
+  data.added.forEach(hash => digest.hashes.add(hash));
+  digest.version = data.version;
+  digest.fetchedAt = Date.now();
+  saveDigest();
+}
+
+function saveDigest() {
+  chrome.storage.local.set({
+    domainDigest: { ...digest, hashes: Array.from(digest.hashes) }
+  });
+}
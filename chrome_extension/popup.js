@@ -48,29 +48,39 @@ document.addEventListener('DOMContentLoaded', function () {
                     headers: {
                         'Content-Type': 'application/json',
                     },
-                    body: JSON.stringify({ query: userInput }),
+                    // Ask for a chart spec so charts are drawn locally instead of shipped as images
+                    // Tables are streamed as NDJSON rows
+                    body: JSON.stringify({ query: userInput, chart_format: 'spec', stream: true }),
                 });
 
                 if (!response.ok) {
                     throw new Error('Network response was not ok');
                 }
 
+                if ((response.headers.get('content-type') || '').includes('ndjson')) {
+                    statusDiv.innerHTML = '';
+                    await renderNdjsonTable(response);
+                    return;
+                }
+
                 // Get the response data
                 const arrayBuffer = await response.arrayBuffer();
                 const contentType = response.headers.get('content-type');
 
                 statusDiv.innerHTML = ''; // Clear status before displaying new content
 
-                if (contentType && contentType.includes('image')) {
-                    // Convert array buffer to base64 for image
-                    const base64String = btoa(
-                        new Uint8Array(arrayBuffer)
-                            .reduce((data, byte) => data + String.fromCharCode(byte), '')
-                    );
-
-                    // Display the image
+                if (contentType && contentType.includes('vegalite')) {
+                    // Draw the chart locally from the declarative spec
+                    const spec = JSON.parse(new TextDecoder('utf-8').decode(arrayBuffer));
+                    resultDiv.appendChild(renderChartSpec(spec));
+                    resultDiv.style.display = "block";
+                    resultDiv.style.marginTop = "20px";
+                    resultDiv.style.textAlign = "center";
+                } else if (contentType && contentType.includes('image')) {
+                    // Display the image (server-side rendering fallback) straight from a blob URL
                     const img = document.createElement('img');
-                    img.src = `data:${contentType};base64,${base64String}`;
+                    img.src = URL.createObjectURL(new Blob([arrayBuffer], { type: contentType }));
+                    img.onload = () => URL.revokeObjectURL(img.src);
                     img.alt = "Generated Chart";
                     img.style.maxWidth = "100%";
                     img.style.height = "auto";
@@ -88,6 +98,11 @@ document.addEventListener('DOMContentLoaded', function () {
                     const jsonString = textDecoder.decode(arrayBuffer);
                     const data = JSON.parse(jsonString);
 
+                    if (!Array.isArray(data) || data.length === 0) {
+                        statusDiv.innerHTML = '<div class="no-info">No results found</div>';
+                        return;
+                    }
+
                     const table = document.createElement('table');
 
                     // Create table headers
@@ -144,6 +159,148 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     });
 
+    // Append table rows as NDJSON lines arrive: {"columns"}, then one array per row, then a trailer
+    async function renderNdjsonTable(response) {
+        const table = document.createElement('table');
+        resultDiv.appendChild(table);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffered = '';
+
+        function handleLine(line) {
+            if (!line.trim()) {
+                return;
+            }
+            const message = JSON.parse(line);
+            if (Array.isArray(message)) {
+                const tableRow = document.createElement('tr');
+                message.forEach(value => {
+                    const td = document.createElement('td');
+                    td.textContent = value;
+                    tableRow.appendChild(td);
+                });
+                table.appendChild(tableRow);
+            } else if (message.columns) {
+                const headerRow = document.createElement('tr');
+                message.columns.forEach(header => {
+                    const th = document.createElement('th');
+                    th.textContent = header;
+                    headerRow.appendChild(th);
+                });
+                table.appendChild(headerRow);
+            } else if (message.error) {
+                statusDiv.innerHTML = '<div class="no-info">Error running the query</div>';
+            } else if (message.truncated) {
+                statusDiv.innerHTML = `<div class="no-info">Showing the first ${message.rows} rows</div>`;
+            }
+        }
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffered + decoder.decode());
+    }
+
+    // Minimal SVG renderer for the bar, arc (pie) and line specs built by chart_renderer.build_chart_spec
+    function renderChartSpec(spec) {
+        const SVG_NS = 'http://www.w3.org/2000/svg';
+        const width = 560, height = 350, margin = { top: 40, right: 20, bottom: 70, left: 50 };
+        const colors = ['#440154', '#414487', '#2a788e', '#22a884', '#7ad151', '#fde725'];
+        const markType = typeof spec.mark === 'string' ? spec.mark : spec.mark.type;
+        const values = spec.data.values;
+
+        const svg = document.createElementNS(SVG_NS, 'svg');
+        svg.setAttribute('viewBox', `0 0 ${width} ${height}`);
+        svg.style.maxWidth = '100%';
+        svg.style.background = '#ffffff';
+        svg.style.borderRadius = '8px';
+
+        function add(tag, attrs, text) {
+            const el = document.createElementNS(SVG_NS, tag);
+            Object.entries(attrs).forEach(([key, value]) => el.setAttribute(key, value));
+            if (text !== undefined) {
+                el.textContent = text;
+            }
+            svg.appendChild(el);
+            return el;
+        }
+
+        add('text', { x: width / 2, y: 24, 'text-anchor': 'middle', 'font-size': 16, 'font-family': 'Arial, sans-serif' }, spec.title || '');
+
+        if (markType === 'arc') {
+            const labelField = spec.encoding.color.field;
+            const valueField = spec.encoding.theta.field;
+            const total = values.reduce((sum, row) => sum + Number(row[valueField] || 0), 0) || 1;
+            const cx = width / 2, cy = (height + margin.top) / 2, r = Math.min(width, height - margin.top) / 2 - 20;
+            let angle = -Math.PI / 2;
+
+            values.forEach((row, i) => {
+                const slice = (Number(row[valueField] || 0) / total) * 2 * Math.PI;
+                const end = angle + slice;
+                const x1 = cx + r * Math.cos(angle), y1 = cy + r * Math.sin(angle);
+                const x2 = cx + r * Math.cos(end), y2 = cy + r * Math.sin(end);
+                const largeArc = slice > Math.PI ? 1 : 0;
+                const path = values.length === 1
+                    ? `M ${cx - r} ${cy} A ${r} ${r} 0 1 1 ${cx + r} ${cy} A ${r} ${r} 0 1 1 ${cx - r} ${cy} Z`
+                    : `M ${cx} ${cy} L ${x1} ${y1} A ${r} ${r} 0 ${largeArc} 1 ${x2} ${y2} Z`;
+                add('path', { d: path, fill: colors[i % colors.length], stroke: '#ffffff' });
+
+                const mid = angle + slice / 2;
+                add('text', {
+                    x: cx + (r + 12) * Math.cos(mid), y: cy + (r + 12) * Math.sin(mid),
+                    'text-anchor': Math.cos(mid) >= 0 ? 'start' : 'end', 'font-size': 11, 'font-family': 'Arial, sans-serif'
+                }, `${row[labelField]} (${(100 * Number(row[valueField] || 0) / total).toFixed(1)}%)`);
+                angle = end;
+            });
+            return svg;
+        }
+
+        const xField = spec.encoding.x.field;
+        const yField = spec.encoding.y.field;
+        const plotWidth = width - margin.left - margin.right;
+        const plotHeight = height - margin.top - margin.bottom;
+        const maxY = Math.max(...values.map(row => Number(row[yField] || 0)), 0) || 1;
+        const step = plotWidth / Math.max(values.length, 1);
+        const yScale = value => margin.top + plotHeight - (Number(value || 0) / maxY) * plotHeight;
+        const xCenter = i => margin.left + step * i + step / 2;
+
+        add('line', { x1: margin.left, y1: margin.top + plotHeight, x2: width - margin.right, y2: margin.top + plotHeight, stroke: '#333333' });
+        add('line', { x1: margin.left, y1: margin.top, x2: margin.left, y2: margin.top + plotHeight, stroke: '#333333' });
+        add('text', { x: margin.left - 6, y: margin.top + 4, 'text-anchor': 'end', 'font-size': 11, 'font-family': 'Arial, sans-serif' }, maxY);
+        add('text', { x: margin.left - 6, y: margin.top + plotHeight, 'text-anchor': 'end', 'font-size': 11, 'font-family': 'Arial, sans-serif' }, 0);
+
+        values.forEach((row, i) => {
+            const label = String(row[xField]).slice(0, 20);
+            add('text', {
+                x: xCenter(i), y: margin.top + plotHeight + 14, 'text-anchor': 'end', 'font-size': 11,
+                'font-family': 'Arial, sans-serif', transform: `rotate(-45 ${xCenter(i)} ${margin.top + plotHeight + 14})`
+            }, label);
+
+            if (markType === 'bar') {
+                const top = yScale(row[yField]);
+                add('rect', {
+                    x: margin.left + step * i + step * 0.15, y: top, width: step * 0.7,
+                    height: margin.top + plotHeight - top, fill: colors[i % colors.length]
+                });
+            }
+        });
+
+        if (markType === 'line') {
+            const points = values.map((row, i) => `${xCenter(i)},${yScale(row[yField])}`).join(' ');
+            add('polyline', { points: points, fill: 'none', stroke: '#0000ff', 'stroke-width': 2 });
+            values.forEach((row, i) => add('circle', { cx: xCenter(i), cy: yScale(row[yField]), r: 4, fill: '#0000ff' }));
+        }
+        return svg;
+    }
+
     function typeWriter(text, container, index = 0, processedText = null) {
         return new Promise(resolve => {
             // Process text only on first run
@@ -2,6 +2,7 @@ CREATE TABLE applied_companies (
     id SERIAL PRIMARY KEY,
     company_name VARCHAR(255) NOT NULL,
     company_website VARCHAR(255),
+    domain VARCHAR(255), -- Registrable domain (eTLD+1) of company_website, see LLM_agents/domain_utils.py
     job_position VARCHAR(255),
     applied_date TIMESTAMP WITH TIME ZONE NOT NULL,
     application_status text,
@@ -9,17 +10,57 @@ CREATE TABLE applied_companies (
 );
 
 
+-- Existing databases: add the column, then backfill it before deploying the API. /check-url
+-- and the extension's domain digest match on domain only, so rows left NULL read as
+-- "not yet applied". Required deploy step, from the project root:
+--     python prefect/prefect_flow.py --backfill-domains
+-- (the Prefect flow also repeats the backfill at the start of every run)
+ALTER TABLE applied_companies ADD COLUMN IF NOT EXISTS domain VARCHAR(255);
+
+-- Covering index so /check-url lookups are index-only scans in applied_date order
+CREATE INDEX IF NOT EXISTS applied_companies_domain_applied_date_idx
+ON applied_companies (domain, applied_date DESC)
+INCLUDE (company_name, job_position, application_status);
+
+
 CREATE EXTENSION IF NOT EXISTS vector;
 
 CREATE TABLE applied_companies_embeddings (
     vector_id SERIAL PRIMARY KEY,
     applied_company_id INT REFERENCES applied_companies(id) ON DELETE CASCADE, -- Foreign key to applied_companies table
-    company_embeddings VECTOR(768) -- SBERT embeddings typically have a dimension of 768
+    company_embeddings VECTOR(384) -- thenlper/gte-small embeddings have 384 dimensions
 );
 
--- Create an index on the embeddings column for cosine similarity
-CREATE INDEX ON applied_companies_embeddings
-USING ivfflat (company_embeddings vector_cosine_ops) WITH (lists = 50);
+-- Existing databases: the column was declared VECTOR(768), which gte-small embeddings never fit
+ALTER TABLE applied_companies_embeddings ALTER COLUMN company_embeddings TYPE VECTOR(384);
+
+-- Replace the old ivfflat index. Similarity search orders by <=> (cosine distance), which is
+-- what vector_cosine_ops indexes; LLM_agents/vector_index.py owns the index from here on and
+-- records what it built below, rebuilding when VECTOR_INDEX_* settings or the row count call for it.
+DROP INDEX IF EXISTS applied_companies_embeddings_company_embeddings_idx;
+
+CREATE TABLE IF NOT EXISTS vector_index_state (
+    index_name TEXT PRIMARY KEY,
+    index_type TEXT NOT NULL,
+    params JSONB NOT NULL,
+    row_count BIGINT NOT NULL,
+    built_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS applied_companies_embeddings_vector_idx
+ON applied_companies_embeddings
+USING hnsw (company_embeddings vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+INSERT INTO vector_index_state (index_name, index_type, params, row_count)
+VALUES ('applied_companies_embeddings_vector_idx', 'hnsw', '{"m": 16, "ef_construction": 64}', 0)
+ON CONFLICT (index_name) DO NOTHING;
+
 
+-- Company-name lookup tried before vector search (LLM_agents/vector_search_agent.py). The
+-- trigram index serves `lower(company_name) % ngram` (indexed column on the left) for each
+-- run of words in the query; `<%` with the column on the left could not use it.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
-REINDEX INDEX applied_companies_embeddings_embedding_idx;
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS applied_companies_company_name_trgm_idx
+ON applied_companies
+USING gin (lower(company_name) gin_trgm_ops);
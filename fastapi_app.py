@@ -1,19 +1,35 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse,JSONResponse, Response
+import time
+
+# Measured from the first line so slow imports show up in the logs and on /ready
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from typing import List, Optional
 from urllib.parse import urlparse
-import psycopg2
+from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
-from datetime import datetime
 import logging
-import pandas as pd
-import matplotlib.pyplot as plt
-import io
-from LLM_agents.vector_search_agent import perform_similarity_search, generate_openai_response, connect_to_postgres
-from LLM_agents.text_to_sql_agent import generate_sql_query, execute_sql_query, visualize_sql_result
-from LLM_agents.agent_selector_assistant import select_agent
+import asyncio
+from LLM_agents.vector_search_agent import pooled_similarity_search, generate_openai_response, get_lookup_stats
+from LLM_agents.text_to_sql_agent import generate_sql_query, execute_sql_query, execute_sql_query_json, stream_sql_query
+from LLM_agents.fast_json import dumps, format_applied_date, rows_to_json
+from LLM_agents.chart_renderer import render_chart, start_renderer, stop_renderer, build_chart_spec, CHART_TYPES, CHART_FORMAT, CHART_MEDIA_TYPES, CHART_SPEC_MEDIA_TYPE
+from LLM_agents.agent_selector_assistant import route_query, choose_routing_arm, record_routing_latency, get_routing_stats
+from LLM_agents.fast_router import fast_router
+from LLM_agents.semantic_cache import router_cache, sql_cache
+from LLM_agents.db_pool import init_pool, init_replica_pool, close_pool, acquire_connection, release_connection, get_pool_stats, get_replica_stats
+from LLM_agents.cache import TTLCache
+from LLM_agents.domain_utils import registrable_domain
+from LLM_agents.domain_digest import DomainDigest
+from LLM_agents import change_listener
+from LLM_agents.llm_gateway import close_gateway, get_llm_stats
+from LLM_agents import embeddings
+from LLM_agents.embedding_replica import embedding_replica, EMBEDDING_REPLICA
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,7 +43,97 @@ DB_USERNAME = os.getenv('DB_USERNAME')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 logging.info(f"DB Connection - Host: {DB_HOST_NAME}, DB: {MAINTENANCE_DB}, Username: {DB_USERNAME}")
 
-app = FastAPI()
+# Importing the app should stay cheap: the embedding model, torch, pandas and matplotlib are
+# all loaded lazily. Exceeding this budget logs a warning so regressions are noticed.
+IMPORT_TIME_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', '3000'))
+
+# Per-domain /check-url results, including empty results for companies not applied to.
+# Entries are dropped whenever the pipeline notifies that applied_companies changed;
+# the TTL only bounds staleness if a notification is ever missed.
+CHECK_URL_CACHE_SIZE = int(os.getenv('CHECK_URL_CACHE_SIZE', '10000'))
+CHECK_URL_CACHE_TTL = float(os.getenv('CHECK_URL_CACHE_TTL', '300'))
+check_url_cache = TTLCache(maxsize=CHECK_URL_CACHE_SIZE, ttl=CHECK_URL_CACHE_TTL)
+
+# Hashed applied domains served to the extension for client-side negative lookups
+domain_digest = DomainDigest()
+change_listener.subscribe(domain_digest.apply_change)
+
+# Company names used by the local router follow the same change feed
+change_listener.subscribe(fast_router.refresh_company_names)
+
+# Optional in-process copy of the company embeddings that answers vector search without Postgres
+if EMBEDDING_REPLICA:
+    change_listener.subscribe(embedding_replica.apply_change, channels=(change_listener.CHANGE_CHANNEL, change_listener.EMBEDDINGS_CHANNEL))
+
+# Serialized text-to-SQL results keyed by (SQL text, chart type, data version). Bumping the
+# data version on every pipeline write makes old entries unreachable; LRU then evicts them.
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '256'))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '86400'))
+result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+# Streamed tables that finish within this many bytes are cached too, as the NDJSON they streamed
+RESULT_CACHE_MAX_STREAM_BYTES = int(os.getenv('RESULT_CACHE_MAX_STREAM_BYTES', '1048576'))
+STREAM_MEDIA_TYPE = "application/x-ndjson"
+
+# Start the vector similarity search while the router is still deciding; the result is
+# used if the vector agent is chosen and discarded otherwise
+SPECULATIVE_VECTOR_SEARCH = os.getenv('SPECULATIVE_VECTOR_SEARCH', 'true').lower() == 'true'
+speculation_stats = {"launched": 0, "used": 0, "discarded": 0, "saved_ms_total": 0.0}
+
+# Upper bound on URLs accepted by /check-urls in one request
+CHECK_URLS_MAX_BATCH = int(os.getenv('CHECK_URLS_MAX_BATCH', '100'))
+# The change listener pins reads to the primary before any subscriber runs, so the cache is
+# never refilled from a replica that has not seen the write yet
+change_listener.subscribe(lambda payload: check_url_cache.clear())
+
+
+def warmup_models():
+    """Load the embedding model and encode the router exemplars. Blocking; run it in the threadpool."""
+    try:
+        embeddings.warmup()
+        fast_router.warmup()
+    except Exception as e:
+        logging.error(f"Error warming up the embedding model: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the model in the background so the server starts accepting requests (and /ready
+    # can report progress) right away
+    warmup_task = asyncio.create_task(run_in_threadpool(warmup_models))
+    # Create the shared connection pool up front so the first requests don't pay the handshakes
+    try:
+        init_pool()
+    except Exception as e:
+        logging.error(f"Error creating database pool at startup: {e}")
+    try:
+        init_replica_pool()
+    except Exception as e:
+        logging.error(f"Error creating read replica pool at startup: {e}")
+    try:
+        await run_in_threadpool(domain_digest.rebuild)
+    except Exception as e:
+        logging.error(f"Error building domain digest at startup: {e}")
+    try:
+        await run_in_threadpool(fast_router.refresh_company_names)
+    except Exception as e:
+        logging.error(f"Error loading company names for the fast router: {e}")
+    if EMBEDDING_REPLICA:
+        try:
+            await run_in_threadpool(embedding_replica.rebuild)
+        except Exception as e:
+            logging.error(f"Error loading the embedding replica: {e}")
+    try:
+        await run_in_threadpool(start_renderer)
+    except Exception as e:
+        logging.error(f"Error starting chart renderer: {e}")
+    change_listener.start_listener()
+    yield
+    warmup_task.cancel()
+    change_listener.stop_listener()
+    stop_renderer()
+    await close_gateway()
+    close_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,11 +143,26 @@ app.add_middleware(
     allow_headers=["*"],   
 )
 
+class FastJSONResponse(Response):
+    """JSON response rendered by orjson. Returned directly, so FastAPI skips its jsonable_encoder pass."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
 class URLRequest(BaseModel):
     url: str
 
+class URLBatchRequest(BaseModel):
+    urls: List[str]
+
 class UserQueryRequest(BaseModel):
     query: str
+    # 'spec' returns a declarative chart spec the popup renders itself; 'png', 'svg' or
+    # 'webp' render the chart on the server. Defaults to the server's CHART_FORMAT.
+    chart_format: Optional[str] = None
+    # Stream table results (chart_type 'Null') as NDJSON from a server-side cursor
+    stream: bool = False
 
 def clean_website_url(url):
     # If the URL doesn't have a scheme (http/https), prepend 'https://'
@@ -61,98 +182,236 @@ def clean_website_url(url):
     logging.info(f"Cleaned URL: {cleaned_url}")
     return cleaned_url
 
-def connect_to_db():
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST_NAME,
-            database=MAINTENANCE_DB,
-            user=DB_USERNAME,
-            password=DB_PASSWORD
-        )
-        logging.info("Database connection successful.")
-        return conn
-    except Exception as e:
-        logging.error(f"Error connecting to database: {e}")
-        return None
+def fetch_applications(conn, domain):
+    """Fetch every application for a registrable domain. Blocking; run it in the threadpool."""
+    with conn.cursor() as cursor:
+        query = """
+        SELECT company_name, job_position, applied_date, application_status 
+        FROM applied_companies 
+        WHERE domain = %s
+        ORDER BY applied_date DESC;
+        """
+        logging.info(f"Executing query for: {domain}")
+        cursor.execute(query, (domain,))
+        return cursor.fetchall()  # Fetch all matching rows
 
-def format_applied_date(applied_date):
-    # If applied_date is already a datetime object, just format it directly
-    if isinstance(applied_date, datetime):
-        return applied_date.strftime("%B %d, %Y, %I:%M %p")
-    
-    # If applied_date is a string, try to parse it
-    if isinstance(applied_date, str):
-        try:
-            parsed_date = datetime.fromisoformat(applied_date)
-            return parsed_date.strftime("%B %d, %Y, %I:%M %p")
-        except ValueError:
-            # If the string is not in ISO format, return it as is or handle it
-            return applied_date
-    
-    # If applied_date is None or unrecognized, return a default message
-    return "Unknown date"
+def fetch_applications_batch(conn, domains):
+    """Fetch applications for many registrable domains in one query. Blocking; run it in the threadpool."""
+    applications = {domain: [] for domain in domains}
+    with conn.cursor() as cursor:
+        query = """
+        SELECT domain, company_name, job_position, applied_date, application_status
+        FROM applied_companies
+        WHERE domain = ANY(%s)
+        ORDER BY domain, applied_date DESC;
+        """
+        logging.info(f"Executing batch query for {len(domains)} domains")
+        cursor.execute(query, (list(domains),))
+        for row in cursor.fetchall():
+            applications[row[0]].append(row[1:])
+    return applications
+
+def build_check_url_response(company_website, results):
+    """Shape application rows for a website into the /check-url response body."""
+    if results:
+        # Build a response with multiple rows
+        response_data = {
+            "message": "Applied for the following positions:",
+            "company_website": company_website,
+            "applications": []
+        }
+
+        # Add each row to the applications list and format the date
+        for row in results:
+            formatted_date = format_applied_date(row[2])  # Convert the date to a readable format
+            response_data["applications"].append({
+                "job_position": row[1],
+                "applied_date": formatted_date,
+                "application_status": row[3]
+            })
+
+        return response_data
+    else:
+        # Return the company website even if no matching applications are found
+        return {
+            "message": f"Not yet applied to {company_website}",
+            "company_website": company_website
+        }
 
 @app.post("/check-url")
 async def check_url(request: URLRequest):
     logging.info(f"Received URL: {request.url}")
     cleaned_url = clean_website_url(request.url)  # Clean the input URL
     company_website = urlparse(cleaned_url).netloc  # Extract the domain
+    domain = registrable_domain(request.url)  # Subdomains and paths collapse to the same key
 
-    conn = connect_to_db()
-    if conn is None:
-        logging.error("Failed to connect to the database.")
-        raise HTTPException(status_code=500, detail="Unable to connect to the database.")
+    results = check_url_cache.get(domain)
+    if results is None:
+        generation = check_url_cache.generation
+        conn = await run_in_threadpool(acquire_connection, readonly=True)
+        if conn is None:
+            logging.error("Failed to connect to the database.")
+            raise HTTPException(status_code=500, detail="Unable to connect to the database.")
+
+        try:
+            results = await run_in_threadpool(fetch_applications, conn, domain)
+        except Exception as e:
+            logging.error(f"Query execution error: {e}")
+            raise HTTPException(status_code=500, detail=f"Error fetching data: {e}")
+        finally:
+            await run_in_threadpool(release_connection, conn)
+
+        check_url_cache.set(domain, results, generation=generation)
+
+    return FastJSONResponse(build_check_url_response(company_website, results))
+
+@app.post("/check-urls")
+async def check_urls(request: URLBatchRequest):
+    logging.info(f"Received {len(request.urls)} URLs")
+    if len(request.urls) > CHECK_URLS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {CHECK_URLS_MAX_BATCH} URLs can be checked per request.")
+
+    # Normalize every URL the same way /check-url does, then answer what we can from the cache
+    websites = [urlparse(clean_website_url(url)).netloc for url in request.urls]
+    domains = [registrable_domain(url) for url in request.urls]
+
+    results_by_domain = {}
+    for domain in set(domains):
+        cached = check_url_cache.get(domain)
+        if cached is not None:
+            results_by_domain[domain] = cached
 
+    missing = [domain for domain in set(domains) if domain not in results_by_domain and domain is not None]
+    if missing:
+        generation = check_url_cache.generation
+        conn = await run_in_threadpool(acquire_connection, readonly=True)
+        if conn is None:
+            logging.error("Failed to connect to the database.")
+            raise HTTPException(status_code=500, detail="Unable to connect to the database.")
+
+        try:
+            fetched = await run_in_threadpool(fetch_applications_batch, conn, missing)
+        except Exception as e:
+            logging.error(f"Batch query execution error: {e}")
+            raise HTTPException(status_code=500, detail=f"Error fetching data: {e}")
+        finally:
+            await run_in_threadpool(release_connection, conn)
+
+        for domain, results in fetched.items():
+            check_url_cache.set(domain, results, generation=generation)
+        results_by_domain.update(fetched)
+
+    return FastJSONResponse({
+        "results": [
+            {"url": url, **build_check_url_response(website, results_by_domain.get(domain, []))}
+            for url, website, domain in zip(request.urls, websites, domains)
+        ]
+    })
+
+@app.get("/applied-domains/digest")
+async def applied_domains_digest(if_none_match: Optional[str] = Header(default=None)):
+    if not domain_digest.loaded:
+        await run_in_threadpool(domain_digest.rebuild)
+
+    version, body = domain_digest.snapshot()
+    etag = f'"{version}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+@app.get("/applied-domains/delta")
+async def applied_domains_delta(since: str):
+    delta = domain_digest.delta(since)
+    if delta is None:
+        # The client's version predates the retained log or a rebuild; it must refetch the digest
+        return {"reset": True, "version": domain_digest.version}
+    return delta
+
+def build_sql_result_response(content, media_type):
+    """Wrap serialized text-to-SQL output (JSON or NDJSON rows, a chart spec or chart image bytes) in a response."""
+    if media_type in ("application/json", CHART_SPEC_MEDIA_TYPE, STREAM_MEDIA_TYPE):
+        return Response(content=content, media_type=media_type)
+
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": "inline",
+            "Cache-Control": "no-cache"
+        }
+    )
+
+async def timed_similarity_search(user_query):
+    """Run the pooled similarity search in the threadpool and report when it finished."""
+    result = await run_in_threadpool(pooled_similarity_search, user_query)
+    return result, time.perf_counter()
+
+def stream_sql_rows(sql_query, result_key):
+    """
+    Yield NDJSON lines for a query. The connection is borrowed only once the response starts
+    iterating, so a response that is never sent holds none; it is returned when the stream
+    ends or the generator is closed after a client disconnect. A stream that completes within
+    RESULT_CACHE_MAX_STREAM_BYTES is stored in the result cache under result_key.
+    """
+    conn = acquire_connection(readonly=True)
+    if conn is None:
+        yield dumps({"error": "Unable to connect to the database."}) + b"\n"
+        return
+    stream = stream_sql_query(conn, sql_query)
+    lines, size = [], 0
     try:
-        with conn.cursor() as cursor:
-            query = """
-            SELECT company_name, job_position, applied_date, application_status 
-            FROM applied_companies 
-            WHERE company_website = %s
-            ORDER BY applied_date DESC;
-            """
-            logging.info(f"Executing query for: {cleaned_url}")
-            cursor.execute(query, (cleaned_url,))
-            results = cursor.fetchall()  # Fetch all matching rows
-
-        if results:
-            # Build a response with multiple rows
-            response_data = {
-                "message": "Applied for the following positions:",
-                "company_website": company_website,
-                "applications": []
-            }
-
-            # Add each row to the applications list and format the date
-            for row in results:
-                formatted_date = format_applied_date(row[2])  # Convert the date to a readable format
-                response_data["applications"].append({
-                    "job_position": row[1],
-                    "applied_date": formatted_date,
-                    "application_status": row[3]
-                })
-
-            return response_data
-        else:
-            # Return the company website even if no matching applications are found
-            return {
-                "message": f"Not yet applied to {company_website}",
-                "company_website": company_website
-            }
-    except Exception as e:
-        logging.error(f"Query execution error: {e}")
-        raise HTTPException(status_code=500, detail=f"Error fetching data: {e}")
+        for line in stream:
+            size += len(line)
+            if size <= RESULT_CACHE_MAX_STREAM_BYTES:
+                lines.append(line)
+            yield line
     finally:
-        conn.close()
+        # Ends the query's transaction before the connection goes back to the pool
+        stream.close()
+        release_connection(conn)
+
+    # Only complete results are cached; failed queries end with an error line instead
+    if size <= RESULT_CACHE_MAX_STREAM_BYTES and lines and lines[-1].startswith(b'{"done"'):
+        result_cache.set(result_key, (b"".join(lines), STREAM_MEDIA_TYPE))
+
+def discard_speculation(task):
+    """Drop a speculative search the router did not need; the worker thread still returns its connection."""
+    task.cancel()
+    speculation_stats["discarded"] += 1
 
 @app.post("/get_user_query")
 async def get_user_query(request: UserQueryRequest):
     user_query = request.query
     logging.info(f"Received user query: {user_query}")
 
+    chart_format = request.chart_format or CHART_FORMAT
+    if chart_format != 'spec' and chart_format not in CHART_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported chart format: {chart_format}")
+
+    speculative_search = None
     try:
-        agent = select_agent(user_query)
+        # A/B switch between the two-call flow and the fused routing + SQL call
+        arm = choose_routing_arm()
+        llm_started = time.perf_counter()
+
+        if SPECULATIVE_VECTOR_SEARCH:
+            speculative_search = asyncio.create_task(timed_similarity_search(user_query))
+            # Retrieve failures of discarded speculations so they are not reported as unhandled
+            speculative_search.add_done_callback(lambda task: task.cancelled() or task.exception())
+            speculation_stats["launched"] += 1
+
+        agent, sql_response, llm_routed = await route_query(user_query, fused=(arm == "fused"))
+        routed_at = time.perf_counter()
         logging.info(f"Selected Agent is: {agent}")
+
+        if agent != 'vector_search_agent' and speculative_search is not None:
+            discard_speculation(speculative_search)
+            speculative_search = None
         
         if agent=='invalid question':
             response = "Please ask relevant questions about a company!!!!"
@@ -161,17 +420,20 @@ async def get_user_query(request: UserQueryRequest):
         
         elif agent=='vector_search_agent':
 
-            # Step 1: Connect to the database
-            conn = connect_to_postgres()
-            if conn is None:
-                raise HTTPException(status_code=500, detail="Unable to connect to the database.")
-
             try:
-                # Step 2: Perform similarity search
-                result = perform_similarity_search(conn, user_query)
+                # Step 1: Perform similarity search on a pooled connection (embedding encode + query
+                # run off the event loop), reusing the speculative search if one was started
+                if speculative_search is not None:
+                    task, speculative_search = speculative_search, None
+                    result, finished_at = await task
+                    # Time the search overlapped with routing, i.e. latency removed from the request
+                    speculation_stats["used"] += 1
+                    speculation_stats["saved_ms_total"] += (min(finished_at, routed_at) - llm_started) * 1000
+                else:
+                    result, _ = await timed_similarity_search(user_query)
                 
                 if result:
-                    # Step 3: Generate a streaming response using OpenAI GPT-3.5
+                    # Step 2: Generate a streaming response using OpenAI GPT-3.5
                     return StreamingResponse(generate_openai_response(user_query, result), media_type="text/plain")
                 else:
                     return {"message": "No similar company found for the query."}
@@ -179,74 +441,132 @@ async def get_user_query(request: UserQueryRequest):
             except Exception as e:
                 logging.error(f"Error in handling query: {e}")
                 raise HTTPException(status_code=500, detail=f"Error processing the query: {e}")
-            
-            finally:
-                if conn:
-                    conn.close()
-                    logging.info("Database connection closed.")
 
         elif agent=='text_to_sql_agent':
 
-            # Step 1: Connect to the database
-            conn = connect_to_postgres()
+            # Step 1: Generate SQL query and chart type before borrowing a connection,
+            # so a pooled connection is not held idle during the LLM round trip
+            json_response = sql_response or await generate_sql_query(user_query)
+            # The A/B compares LLM time only: the fused call, or the routing call plus an
+            # uncached SQL generation. Cache and fast-router answers would skew the averages.
+            if llm_routed and (arm == "fused" or not (json_response or {}).get("cached")):
+                record_routing_latency(arm, (time.perf_counter() - llm_started) * 1000)
+            
+            if not json_response or 'sql' not in json_response:
+                return {"message": "Failed to generate SQL query or chart."}
+                
+            sql_query = json_response['sql']
+            # The chart type is free-form LLM output (null, "Histogram", ...); anything the
+            # renderer cannot draw is answered as a table
+            chart_type = json_response.get('chart_type')
+            if chart_type not in CHART_TYPES:
+                chart_type = 'Null'
+
+            # Step 2: Identical analytic questions are answered from the result cache until
+            # the pipeline next writes to applied_companies and bumps the data version.
+            # Streamed tables are cached as NDJSON, separately from buffered JSON tables.
+            streaming = request.stream and chart_type == 'Null'
+            result_key = (sql_query, chart_type, 'ndjson' if streaming else chart_format, change_listener.get_data_version())
+            cached = result_cache.get(result_key)
+            if cached is not None:
+                logging.info("Serving SQL result from cache.")
+                content, media_type = cached
+                return build_sql_result_response(content, media_type)
+
+            # Tables can be streamed row by row instead of being materialized first
+            if streaming:
+                # Starlette iterates a sync generator in the threadpool, so the connection
+                # checkout and fetches never block the loop
+                return StreamingResponse(stream_sql_rows(sql_query, result_key), media_type=STREAM_MEDIA_TYPE)
+
+            # Step 3: Connect to the database
+            conn = await run_in_threadpool(acquire_connection, readonly=True)
             if conn is None:
                 raise HTTPException(status_code=500, detail="Unable to connect to the database.")
             
             try:
-                # Step 2: Generate SQL query and chart type
-                json_response = generate_sql_query(user_query)
-                
-                if not json_response or 'sql' not in json_response:
-                    return {"message": "Failed to generate SQL query or chart."}
-                    
-                sql_query = json_response['sql']
-                chart_type = json_response.get('chart_type', 'Null')
-                
-                # Step 3: Execute the SQL query
-                headers, result = execute_sql_query(conn, sql_query)
-                
-                # Step 4: Process and return results
+                # Step 4: Execute the SQL query and process the results
                 if chart_type == 'Null':
-                    # Convert result to DataFrame and handle datetime serialization
-                    table = pd.DataFrame(result, columns=headers)
-                    
-                    # Convert all datetime columns to ISO format strings
-                    for column in table.columns:
-                        if isinstance(table[column].iloc[0], (datetime, pd.Timestamp)):
-                            table[column] = table[column].apply(lambda x: x.isoformat() if x else None)
-                    
-                    return JSONResponse(content=table.to_dict(orient='records'))
+                    # Rows are written straight to JSON records, with no DataFrame in between
+                    headers, content = await run_in_threadpool(execute_sql_query_json, conn, sql_query)
+                    if headers is None:
+                        content = b"[]"
+                    media_type = "application/json"
                 else:
-                    # Generate visualization
-                    buffer = io.BytesIO()
-                    visualize_sql_result(result, headers, chart_type)
-                    plt.savefig(buffer, format='png', bbox_inches='tight', dpi=300)
-                    plt.close()
-                    
-                    buffer.seek(0)
-                    image_bytes = buffer.getvalue()
-                    buffer.close()
-                    
-                    return Response(
-                        content=image_bytes,
-                        media_type="image/png",
-                        headers={
-                            "Content-Disposition": "inline",
-                            "Cache-Control": "no-cache"
-                        }
-                    )
+                    headers, result = await run_in_threadpool(execute_sql_query, conn, sql_query)
+                    if headers is None:
+                        # Same response as a failed table query
+                        content, media_type = b"[]", "application/json"
+                    elif len(headers) < 2:
+                        # Nothing to plot against; send the rows as a table instead
+                        content, media_type = rows_to_json(headers, result), "application/json"
+                    elif chart_format == 'spec':
+                        # Let the popup draw the chart from a compact spec built from the same rows
+                        content = dumps(build_chart_spec(result, headers, chart_type))
+                        media_type = CHART_SPEC_MEDIA_TYPE
+                    else:
+                        # Generate visualization in the chart renderer's process pool
+                        content, media_type = await render_chart(result, headers, chart_type, chart_format)
+
+                # Failed queries return no headers; never cache those
+                if headers is not None:
+                    result_cache.set(result_key, (content, media_type))
+                return build_sql_result_response(content, media_type)
                     
             except Exception as e:
                 logging.error(f"Error in handling query: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
             
             finally:
-                if conn:
-                    conn.close()
-                    logging.info("Database connection closed.")
+                await run_in_threadpool(release_connection, conn)
 
     except Exception as e:
         logging.error(f"Error in handling query: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing the query: {e}")
-    
 
+    finally:
+        # Routing failed before the speculative search could be claimed or discarded
+        if speculative_search is not None:
+            discard_speculation(speculative_search)
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the embedding model and the database pool are warm, 503 before."""
+    pool_stats = get_pool_stats()
+    checks = {
+        "embedding_model": embeddings.is_ready(),
+        "db_pool": bool(pool_stats) and pool_stats["in_use"] + pool_stats["idle"] >= pool_stats["min_size"],
+    }
+    body = {"ready": all(checks.values()), "checks": checks, "import_ms": IMPORT_MS}
+    return FastJSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "db_pool": get_pool_stats(),
+        "db_replica": get_replica_stats(),
+        "check_url_cache": check_url_cache.stats(),
+        "router": fast_router.stats(),
+        "router_cache": router_cache.stats(),
+        "sql_cache": sql_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "routing_ab": get_routing_stats(),
+        "llm": get_llm_stats(),
+        "speculative_vector_search": {
+            **speculation_stats,
+            "hit_rate": round(speculation_stats["used"] / speculation_stats["launched"], 4) if speculation_stats["launched"] else 0.0,
+            "saved_ms_avg": round(speculation_stats["saved_ms_total"] / speculation_stats["used"], 1) if speculation_stats["used"] else 0.0,
+        },
+        "company_lookup": get_lookup_stats(),
+        "embedding_replica": embedding_replica.stats(),
+        "data_version": change_listener.get_data_version(),
+        "embeddings": embeddings.get_embedding_stats(),
+        "query_embeddings": embeddings.query_embedding_cache.stats(),
+        "import_ms": IMPORT_MS,
+    }
+
+IMPORT_MS = round((time.perf_counter() - _import_started) * 1000, 1)
+if IMPORT_MS > IMPORT_TIME_BUDGET_MS:
+    logging.warning(f"fastapi_app imported in {IMPORT_MS} ms, over the {IMPORT_TIME_BUDGET_MS:.0f} ms budget.")
+else:
+    logging.info(f"fastapi_app imported in {IMPORT_MS} ms.")
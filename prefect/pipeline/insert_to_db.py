@@ -2,12 +2,15 @@ import os
 import sys
 import psycopg2
 from psycopg2 import sql, Error
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 import logging
 
 from pipeline.gpt_processing_emails import extract_job_application_emails
 from pipeline.outlookapi import fetch_emails_last_24_hours
+from LLM_agents.change_listener import notify_change
+from LLM_agents.domain_utils import registrable_domain
+from LLM_agents.embeddings import encode
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -20,8 +23,6 @@ MAINTENANCE_DB = os.getenv('MAINTENANCE_DB')
 DB_USERNAME = os.getenv('DB_USERNAME')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 
-model = SentenceTransformer('thenlper/gte-small')
-
 def get_db_connection():
     """Create and return a connection to the PostgreSQL database."""
     try:
@@ -41,11 +42,12 @@ def insert_applied_company(cursor, company_name, company_website, job_position,
     """Insert applied company data into the PostgreSQL database."""
     try:
         insert_query = sql.SQL("""
-            INSERT INTO applied_companies (company_name, company_website, job_position, applied_date, application_status)
-            VALUES (%s, %s, %s, %s, %s)
+            INSERT INTO applied_companies (company_name, company_website, domain, job_position, applied_date, application_status)
+            VALUES (%s, %s, %s, %s, %s, %s)
             RETURNING id;
         """)
-        cursor.execute(insert_query, (company_name, company_website, job_position, applied_date, application_status))
+        domain = registrable_domain(company_website)  # Normalized key used by /check-url lookups
+        cursor.execute(insert_query, (company_name, company_website, domain, job_position, applied_date, application_status))
         company_id = cursor.fetchone()[0]
         logging.info(f"Inserted: {company_name}, {company_website}, {job_position}, {applied_date}, {application_status} with ID: {company_id}")
 
@@ -54,11 +56,42 @@ def insert_applied_company(cursor, company_name, company_website, job_position,
     except Exception as e:
         logging.error(f"Error inserting data: {e}")
 
+def backfill_company_domains(conn):
+    """
+    Populate the normalized domain column for rows inserted before it existed.
+    Returns the number of rows updated, or None if the backfill failed.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, company_website
+                FROM applied_companies
+                WHERE domain IS NULL AND company_website IS NOT NULL;
+            """)
+            updates = [(company_id, registrable_domain(website)) for company_id, website in cursor.fetchall()]
+            updates = [(company_id, domain) for company_id, domain in updates if domain]
+
+            if updates:
+                execute_values(cursor, """
+                    UPDATE applied_companies AS ac
+                    SET domain = data.domain
+                    FROM (VALUES %s) AS data (id, domain)
+                    WHERE ac.id = data.id;
+                """, updates)
+                notify_change(cursor, 'applied_companies', [company_id for company_id, _ in updates])
+        conn.commit()
+        logging.info(f"Backfilled domain for {len(updates)} existing applications.")
+        return len(updates)
+    except (Exception, Error) as e:
+        conn.rollback()
+        logging.error(f"Error backfilling company domains: {e}")
+        return None
+
 def generate_embedding(company_name, company_website, job_position, applied_date, application_status):
     """Generate an embedding for the given company data."""
     try:
         text_to_embed = f"{company_name} {company_website} {job_position} Applied on: {applied_date} Status: {application_status}"
-        embedding = model.encode([text_to_embed])[0]  # Model returns a list, get the first item
+        embedding = encode([text_to_embed])[0]  # Model returns a list, get the first item
         logging.info(f"Generated embedding for: {company_name}")
         return embedding
     except Exception as e:
@@ -105,6 +138,10 @@ def process_applications(conn, email_context):
                         'applied_date': applied_date,
                         'application_status': application_status
                     })
+
+            if company_data_list:
+                # Tell the API to drop cached lookups; delivered only once the commit succeeds
+                notify_change(cursor, 'applied_companies', [c['company_id'] for c in company_data_list])
             
             conn.commit()  # Commit after all companies have been inserted
             logging.info("All applications successfully inserted.")
@@ -132,6 +169,9 @@ def process_embeddings(conn, company_data_list):
                     # Insert the embedding
                     insert_embedding(cursor, company_id, embedding)
 
+            # Lets the API's in-memory embedding replica pick up the new rows after the commit
+            notify_change(cursor, 'applied_companies_embeddings', [c['company_id'] for c in company_data_list])
+
             conn.commit()  # Commit after all embeddings have been inserted
             logging.info("All embeddings successfully inserted.")
     else:
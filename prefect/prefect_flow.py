@@ -19,7 +19,25 @@ os.environ['TOKEN_FILE'] = os.path.join(PIPELINE_DIR, "token_cache.json")
 
 from pipeline.outlookapi import fetch_emails_last_24_hours
 from pipeline.gpt_processing_emails import extract_job_application_emails
-from pipeline.insert_to_db import process_applications, process_embeddings, get_db_connection
+from pipeline.insert_to_db import process_applications, process_embeddings, get_db_connection, backfill_company_domains
+from LLM_agents.vector_index import ensure_vector_index
+
+# Task 0: Backfill Company Domains Task
+@task(name="Backfill Company Domains")
+def backfill_domains_task():
+    """Task to fill applied_companies.domain for rows written before the column existed"""
+    logger = get_run_logger()
+
+    # Runs before any mail is fetched, so /check-url and the domain digest see existing
+    # applications even on days without new ones. A failure here does not stop the flow.
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Failed to connect to the database for the domain backfill.")
+        return None
+    try:
+        return backfill_company_domains(conn)
+    finally:
+        conn.close()
 
 # Task 1: Fetch Emails Task
 @task(name="Fetch Emails", retries=3, retry_delay_seconds=60)
@@ -107,6 +125,9 @@ def insert_embeddings_task(company_data_list):
                 logger.info("Inserting embeddings for companies into the database.")
                 process_embeddings(conn, company_data_list)
                 conn.commit()
+
+                # Rebuild or retune the vector index if the table outgrew it or its settings changed
+                ensure_vector_index(conn)
                 conn.close()
 
                 logger.info("Successfully inserted embeddings into the database.")
@@ -126,6 +147,9 @@ def job_applications_flow():
     logger = get_run_logger()
     logger.info("Starting Job Applications Processing Flow.")
 
+    # Fill domains of existing applications; independent of today's mail
+    backfill_domains_task()
+
     # Fetch emails from Outlook
     email_data_state = fetch_emails_task(return_state=True)
     
@@ -165,6 +189,17 @@ def job_applications_flow():
     logger.info("Job Applications Processing Flow completed.")
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["--backfill-domains"]:
+        # Deploy step after adding applied_companies.domain; needs no Outlook token
+        conn = get_db_connection()
+        if not conn:
+            sys.exit("Failed to connect to the database.")
+        try:
+            updated = backfill_company_domains(conn)
+        finally:
+            conn.close()
+        sys.exit(0 if updated is not None else "Domain backfill failed.")
+
     token_file = os.path.join(PIPELINE_DIR, "token_cache.json")
     
     if not os.path.exists(token_file):
@@ -0,0 +1,41 @@
+from LLM_agents.company_mentions import exact_names, candidate_fragments, _name_pattern
+
+KNOWN = ["Stripe", "Plaid", "Google", "Johnson & Johnson", "Procter and Gamble", "Ernst and Young", "Meta", "Meta Platforms"]
+
+
+def mentions(query, known=KNOWN, max_words=4):
+    """Companies the vector agent would look up: exact names, then fragments naming a known company."""
+    names = exact_names([name for name in known if _name_pattern(name).search(query)])
+    known_keys = {name.lower() for name in known}
+    return names + [fragment for fragment in candidate_fragments(query, names, max_words) if fragment.lower() in known_keys]
+
+
+def test_list_of_companies():
+    assert mentions("Did I apply to Stripe, Plaid and Brex?") == ["Stripe", "Plaid"]
+    assert candidate_fragments("Did I apply to Stripe, Plaid and Brex?", ["Stripe"], 4) == ["Plaid", "Brex"]
+
+
+def test_separator_inside_a_company_name_does_not_split_it():
+    assert mentions("What's the status of my Johnson & Johnson application?") == ["Johnson & Johnson"]
+    assert mentions("Did I apply to Procter and Gamble?") == ["Procter and Gamble"]
+    assert mentions("did i apply to ernst and young") == ["Ernst and Young"]
+
+
+def test_clauses_are_not_companies():
+    assert mentions("Did I apply to Google and get an interview?") == ["Google"]
+    assert mentions("Have I been rejected or ghosted by Google?") == ["Google"]
+    assert mentions("Did I apply to Stripe? and when?") == ["Stripe"]
+
+
+def test_single_company_question_has_no_fragments():
+    assert candidate_fragments("What is the status of my Google application?", ["Google"], 4) == []
+    assert candidate_fragments("Any update on my Netflix application?", [], 4) == []
+
+
+def test_misspelled_names_are_fragments():
+    assert candidate_fragments("Did I apply to Stirpe or Plaid?", ["Plaid"], 4) == ["Stirpe"]
+
+
+def test_contained_names_are_dropped():
+    assert exact_names(["Meta", "Meta Platforms", "meta"]) == ["Meta Platforms"]
+    assert mentions("Did I apply to Meta Platforms?") == ["Meta Platforms"]
@@ -0,0 +1,66 @@
+import pytest
+
+from LLM_agents.sql_guard import validate_sql, SQLGuardError
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT table_to_xml('pg_authid', true, false, '')",
+    "SELECT database_to_xml(true, false, '')",
+    "SELECT \"query_to_xml\"('select * from pg_shadow', true, false, '')",
+    "SELECT \"pg_read_file\"('/etc/passwd')",
+    "SELECT pg_catalog.pg_read_file('/etc/passwd')",
+    "SELECT cursor_to_xml('c', 1, false, false, '')",
+    "SELECT set_config('statement_timeout', '0', false)",
+    "SELECT company_name FROM applied_companies WHERE dblink_exec('x', 'y') = 'OK'",
+    "WITH pg_read_file AS (SELECT 1) SELECT pg_read_file('/etc/passwd')",
+    "SELECT E'\\'', pg_read_file('/etc/passwd') --'",
+    "SELECT $$ ' $$, pg_read_file('/etc/passwd'), $$ ' $$",
+])
+def test_rejects_functions_outside_the_allowlist(sql):
+    with pytest.raises(SQLGuardError):
+        validate_sql(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM pg_authid",
+    "SELECT * FROM applied_companies, pg_shadow",
+    "DELETE FROM applied_companies",
+    "SELECT 1; DROP TABLE applied_companies",
+    "SELECT * FROM applied_companies FOR UPDATE",
+])
+def test_rejects_other_tables_and_statements(sql):
+    with pytest.raises(SQLGuardError):
+        validate_sql(sql)
+
+
+def test_accepts_from_inside_extract_and_substring():
+    sql = ("SELECT EXTRACT(MONTH FROM applied_date) AS month, SUBSTRING(company_name FROM 1 FOR 3) "
+           "FROM applied_companies LIMIT 5")
+    assert validate_sql(sql) == sql
+
+
+def test_accepts_keywords_inside_literals():
+    sql = "SELECT company_name FROM applied_companies WHERE application_status = 'delete; drop pg_read_file(' LIMIT 5"
+    assert validate_sql(sql) == sql
+
+
+def test_accepts_common_functions_and_casts():
+    sql = ("WITH monthly (month, total) AS (SELECT date_trunc('month', applied_date), count(*) "
+           "FROM applied_companies GROUP BY 1) "
+           "SELECT to_char(month, 'YYYY-MM'), total::numeric(10, 2), CAST(total AS varchar(20)) FROM monthly LIMIT 12")
+    assert validate_sql(sql) == sql
+
+
+def test_limit_in_a_subquery_still_gets_an_outer_limit():
+    sql = "SELECT * FROM (SELECT company_name FROM applied_companies LIMIT 10) recent"
+    assert validate_sql(sql, default_limit=50) == f"{sql}\nLIMIT 50"
+
+
+def test_outer_limit_is_kept():
+    sql = "SELECT company_name FROM applied_companies ORDER BY applied_date DESC LIMIT 10"
+    assert validate_sql(sql) == sql
+
+
+def test_offset_only_gets_a_limit():
+    sql = "SELECT company_name FROM applied_companies ORDER BY applied_date OFFSET 20"
+    assert validate_sql(sql, default_limit=50) == f"{sql}\nLIMIT 50"